@@ -1,13 +1,23 @@
+import argparse
+import cProfile
+import json
 import time
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from kem.keygen import ml_kem_keygen
-from kem.encapsulate import ml_kem_encaps, ml_kem_encaps_deterministic
-from kem.decapsulate import ml_kem_decaps
-from pke.params import ML_KEM_512, ML_KEM_768, ML_KEM_1024
+from kem.keygen import ml_kem_keygen, ml_kem_keygen_batch
+from kem.encapsulate import ml_kem_encaps, ml_kem_encaps_deterministic, ml_kem_encaps_batch
+from kem.decapsulate import ml_kem_decaps, ml_kem_decaps_batch
+from pke.params import ML_KEM_512, ML_KEM_768, ML_KEM_1024, get_params
+from utils.stats import summarize
+from utils import instrumentation
+
+SCALING_OPERATIONS = ('keygen', 'encaps', 'decaps')
+DEFAULT_SCALING_OPS = 256
+DEFAULT_BATCH_SIZES = (1, 16)
 
 def time_operation(operation_func, iterations=25):
     for _ in range(3):
@@ -49,11 +59,12 @@ def benchmark_kem_operations(params, iterations=25):
     )
     
     print("  → Decapsulation...")
-    def decaps_op():
-        _, c = ml_kem_encaps(ek, params)
-        return ml_kem_decaps(dk, c, params)
-    
-    results['decaps'] = time_operation(decaps_op, iterations)
+    # The ciphertext is made outside the timed region so only decaps is measured
+    _, c = ml_kem_encaps(ek, params)
+    results['decaps'] = time_operation(
+        lambda: ml_kem_decaps(dk, c, params),
+        iterations
+    )
     
     print("  → Full KEM Cycle...")
     def full_cycle():
@@ -131,7 +142,148 @@ def print_comparison_table(all_results):
         throughput = results['throughput']
         print(f"{variant:<12} {throughput['keygen_ops_per_sec']:<10.1f} {throughput['encaps_ops_per_sec']:<10.1f} {throughput['decaps_ops_per_sec']:<10.1f} {throughput['full_cycle_ops_per_sec']:<10.1f}")
 
+def print_stage_breakdown(variant_name, snapshot, top=12):
+    stages = snapshot['stages']
+    total_self = sum(s['self_ms'] for s in stages.values()) or 1.0
+    print(f"\n{variant_name} STAGE BREAKDOWN (self time, top {top}):")
+    print("-" * 80)
+    ranked = sorted(stages.items(), key=lambda item: item[1]['self_ms'], reverse=True)
+    for path, s in ranked[:top]:
+        print(f"{path:<52} {s['calls']:>6} calls {s['self_ms']:>9.2f} ms {s['self_ms'] / total_self:>6.1%}")
+    for name, value in sorted(snapshot['counters'].items()):
+        print(f"{name:<52} {value:>12,}")
+
+def _scaling_task(operation, params_name, batch, ek, dk, cs):
+    # Runs in a worker thread or process; returns the batch's service time in ms
+    params = get_params(params_name)
+    start = time.perf_counter()
+    if operation == 'keygen':
+        ml_kem_keygen_batch(params, batch)
+    elif operation == 'encaps':
+        ml_kem_encaps_batch(ek, params, batch)
+    else:
+        ml_kem_decaps_batch(dk, cs[:batch], params)
+    return (time.perf_counter() - start) * 1000
+
+def worker_counts(max_workers):
+    counts = []
+    n = 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    return counts + [max_workers]
+
+def run_scaling_config(pool, operation, params, batch, total_ops, ek, dk, cs):
+    tasks = max(1, total_ops // batch)
+    start = time.perf_counter()
+    futures = [pool.submit(_scaling_task, operation, params.name, batch, ek, dk, cs) for _ in range(tasks)]
+    latencies = [f.result() for f in futures]
+    wall = time.perf_counter() - start
+    latency = summarize(latencies)
+    return {
+        'ops': tasks * batch,
+        'ops_per_sec': tasks * batch / wall,
+        'batch_p50_ms': latency['p50'],
+        'batch_p95_ms': latency['p95'],
+        'batch_p99_ms': latency['p99'],
+    }
+
+def benchmark_scaling(params, max_workers, batch_sizes, total_ops=DEFAULT_SCALING_OPS):
+    """ops/sec, per-worker efficiency and batch tail latency for every
+    (pool kind, worker count, batch size, operation) combination."""
+    print(f"\nScaling {params.name} up to {max_workers} workers, batch sizes {list(batch_sizes)}:")
+    ek, dk = ml_kem_keygen(params)
+    cs = [ml_kem_encaps(ek, params)[1] for _ in range(max(batch_sizes))]
+    rows = []
+    for kind, pool_class in (('threads', ThreadPoolExecutor), ('processes', ProcessPoolExecutor)):
+        single = {}
+        for workers in worker_counts(max_workers):
+            with pool_class(max_workers=workers) as pool:
+                # Start every worker (and its imports) before anything is timed
+                list(pool.map(_scaling_task, ['keygen'] * workers, [params.name] * workers,
+                              [1] * workers, [ek] * workers, [dk] * workers, [cs] * workers))
+                for batch in batch_sizes:
+                    for operation in SCALING_OPERATIONS:
+                        result = run_scaling_config(pool, operation, params, batch, total_ops, ek, dk, cs)
+                        baseline = single.setdefault((operation, batch), result['ops_per_sec'])
+                        result['efficiency'] = result['ops_per_sec'] / (baseline * workers)
+                        result.update(kind=kind, workers=workers, batch=batch, operation=operation)
+                        rows.append(result)
+                        print(f"  {kind:<9} workers={workers:<3} batch={batch:<4} {operation:<7} "
+                              f"{result['ops_per_sec']:>9.1f} ops/s  efficiency {result['efficiency']:>6.1%}  "
+                              f"batch p99 {result['batch_p99_ms']:>8.2f} ms")
+    return rows
+
+def print_scaling_summary(params, rows):
+    print(f"\nBEST CONFIGURATION PER OPERATION ({params.name}):")
+    print("-" * 80)
+    for operation in SCALING_OPERATIONS:
+        best = max((r for r in rows if r['operation'] == operation), key=lambda r: r['ops_per_sec'])
+        print(f"{operation:<8} {best['ops_per_sec']:>9.1f} ops/s with {best['workers']} {best['kind']}, "
+              f"batch {best['batch']} (efficiency {best['efficiency']:.1%})")
+
+def run_scaling(args):
+    print("ML-KEM MULTI-CORE SCALING BENCHMARK")
+    print("=" * 60)
+    print(f"CPUs available: {os.cpu_count()}")
+    report = {}
+    for name in args.variants:
+        params = get_params(name)
+        rows = benchmark_scaling(params, args.max_workers, args.batch_sizes, args.ops)
+        print_scaling_summary(params, rows)
+        report[name] = rows
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+def positive_int(value):
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {n}")
+    return n
+
 def main():
+    parser = argparse.ArgumentParser(description="ML-KEM performance benchmark")
+    parser.add_argument('--scaling', action='store_true',
+                        help="Measure throughput against worker count and batch size instead")
+    parser.add_argument('--variants', nargs='+', default=[ML_KEM_768.name],
+                        choices=[p.name for p in (ML_KEM_512, ML_KEM_768, ML_KEM_1024)],
+                        help="Parameter sets for --scaling")
+    parser.add_argument('--max-workers', type=positive_int, default=os.cpu_count() or 1)
+    parser.add_argument('--batch-sizes', type=positive_int, nargs='+', default=list(DEFAULT_BATCH_SIZES))
+    parser.add_argument('--ops', type=positive_int, default=DEFAULT_SCALING_OPS,
+                        help="Operations per configuration in --scaling")
+    parser.add_argument('--output', default=None, help="Write --scaling results as JSON to this file")
+    parser.add_argument('--stages', action='store_true',
+                        help="Record per-stage timings and counters and print a breakdown per variant")
+    parser.add_argument('--stages-output', default=None,
+                        help="Write the per-variant stage snapshots as JSON (implies --stages)")
+    parser.add_argument('--folded', default=None,
+                        help="Write stage self times as folded stacks for flamegraph tools (implies --stages)")
+    parser.add_argument('--profile', default=None,
+                        help="Run under cProfile and dump the stats to this file")
+    args = parser.parse_args()
+    if args.scaling:
+        run_scaling(args)
+        return
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        run_benchmarks(args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"cProfile stats written to {args.profile}")
+
+def run_benchmarks(args):
+    stages = args.stages or args.stages_output is not None or args.folded is not None
+    snapshots = {}
+    folded = []
+
     print("ML-KEM FOCUSED PERFORMANCE BENCHMARK")
     print("=" * 60)
     
@@ -144,11 +296,28 @@ def main():
     all_results = {}
     for name, params in variants:
         try:
+            if stages:
+                instrumentation.enable()
             results = benchmark_kem_operations(params, iterations=25)
             all_results[name] = results
             print_performance_summary(name, results)
+            if stages:
+                snapshots[name] = instrumentation.snapshot()
+                folded.append(instrumentation.folded_stacks(prefix=name))
+                print_stage_breakdown(name, snapshots[name])
         except Exception as e:
             print(f"Error benchmarking {name}: {e}")
+        finally:
+            instrumentation.disable()
+    
+    if args.stages_output is not None:
+        with open(args.stages_output, 'w') as f:
+            json.dump(snapshots, f, indent=2)
+        print(f"\nStage snapshots written to {args.stages_output}")
+    if args.folded is not None:
+        with open(args.folded, 'w') as f:
+            f.write("".join(folded))
+        print(f"Folded stacks written to {args.folded}")
     
     if all_results:
         print_comparison_table(all_results)
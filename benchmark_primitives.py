@@ -0,0 +1,178 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from kem.keygen import ml_kem_keygen
+from kem.encapsulate import ml_kem_encaps_deterministic
+from kem.decapsulate import ml_kem_decaps
+from pke.params import ML_KEM_512, ML_KEM_768, ML_KEM_1024, Q, get_params
+from utils.poly_utils import (
+    ntt, ntt_array, ntt_inverse, ntt_inverse_array, sample_ntt, sample_poly_cbd,
+    matrix_vector_mul_ntt, matrix_vector_mul_ntt_array, sample_ntt_matrix,
+)
+from utils.serialization import byte_encode_array, byte_decode_array, compress_encode_array, decode_decompress_array
+from utils.stats import summarize
+
+DEFAULT_MIN_TIME = 0.5
+DEFAULT_THRESHOLD = 0.10
+MIN_SAMPLE_SECONDS = 2e-4
+MIN_SAMPLES = 10
+MAX_SAMPLES = 2000
+
+def calibrate(fn):
+    """Calls per sample, so that one sample is well above timer overhead."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= MIN_SAMPLE_SECONDS:
+            return number
+        number *= 2
+
+def time_primitive(fn, min_time=DEFAULT_MIN_TIME):
+    # Warm-up also fills any lazily built tables
+    for _ in range(3):
+        fn()
+    number = calibrate(fn)
+    samples = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < MAX_SAMPLES and (len(samples) < MIN_SAMPLES or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number * 1e6)
+    summary = summarize(samples)
+    return {
+        'median_us': summary['p50'],
+        'p95_us': summary['p95'],
+        'stddev_us': summary['stddev'],
+        'mean_us': summary['mean'],
+        'min_us': summary['min'],
+        'samples': summary['count'],
+        'calls_per_sample': number,
+    }
+
+def build_primitives(params):
+    """Name -> zero-argument callable; every input is generated up front."""
+    rng = np.random.default_rng(0)
+    k = params.k
+    poly = rng.integers(0, Q, 256).tolist()
+    poly_array = np.array(poly, dtype=np.int64)
+    seed = bytes(rng.integers(0, 256, 34, dtype=np.uint8))
+    sigma = bytes(rng.integers(0, 256, 32, dtype=np.uint8))
+    A_hat = sample_ntt_matrix(seed[:32], k)
+    s_hat = rng.integers(0, Q, (k, 256))
+    A_list, s_list = A_hat.tolist(), s_hat.tolist()
+
+    ek, dk = ml_kem_keygen(params)
+    m = bytes(rng.integers(0, 256, 32, dtype=np.uint8))
+    _, c = ml_kem_encaps_deterministic(ek, m, params)
+
+    primitives = {
+        'ntt': lambda: ntt(poly),
+        'ntt_array': lambda: ntt_array(poly_array),
+        'ntt_inverse': lambda: ntt_inverse(poly),
+        'ntt_inverse_array': lambda: ntt_inverse_array(poly_array),
+        'sample_ntt': lambda: sample_ntt(seed),
+    }
+    for eta in sorted({params.eta1, params.eta2}):
+        primitives[f'sample_poly_cbd[eta={eta}]'] = lambda eta=eta: sample_poly_cbd(sigma, 0, eta)
+    for d in sorted({1, params.du, params.dv, 12}):
+        coeffs = rng.integers(0, Q if d == 12 else 1 << d, (k, 256))
+        encoded = byte_encode_array(coeffs, d)
+        primitives[f'byte_encode[d={d}]'] = lambda coeffs=coeffs, d=d: byte_encode_array(coeffs, d)
+        primitives[f'byte_decode[d={d}]'] = lambda encoded=encoded, d=d: byte_decode_array(encoded, d)
+    coeffs = rng.integers(0, Q, (k, 256))
+    for d in sorted({1, params.du, params.dv}):
+        packed = compress_encode_array(coeffs, d)
+        primitives[f'compress_encode[d={d}]'] = lambda d=d: compress_encode_array(coeffs, d)
+        primitives[f'decode_decompress[d={d}]'] = lambda packed=packed, d=d: decode_decompress_array(packed, d)
+    primitives['matrix_vector_mul_ntt'] = lambda: matrix_vector_mul_ntt(A_list, s_list)
+    primitives['matrix_vector_mul_ntt_array'] = lambda: matrix_vector_mul_ntt_array(A_hat, s_hat)
+    primitives['keygen'] = lambda: ml_kem_keygen(params)
+    primitives['encaps'] = lambda: ml_kem_encaps_deterministic(ek, m, params)
+    primitives['decaps'] = lambda: ml_kem_decaps(dk, c, params)
+    return primitives
+
+def run_suite(params, min_time=DEFAULT_MIN_TIME, only=None):
+    results = {}
+    for name, fn in build_primitives(params).items():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        results[name] = time_primitive(fn, min_time)
+        r = results[name]
+        print(f"  {name:<30} median {r['median_us']:>11.2f} us   p95 {r['p95_us']:>11.2f} us   "
+              f"stddev {r['stddev_us']:>9.2f} us   ({r['samples']} x {r['calls_per_sample']})")
+    return results
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Names whose median got slower than the baseline by more than ``threshold``."""
+    regressions = []
+    print(f"\nComparison with baseline (regression threshold {threshold:.0%}):")
+    for name, r in results.items():
+        old = baseline.get(name)
+        if old is None:
+            print(f"  {name:<30} (not in baseline)")
+            continue
+        change = r['median_us'] / old['median_us'] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"  {name:<30} {old['median_us']:>11.2f} -> {r['median_us']:>11.2f} us  ({change:+.1%}){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-primitive ML-KEM micro-benchmarks")
+    parser.add_argument('--params', default=ML_KEM_768.name,
+                        choices=[p.name for p in (ML_KEM_512, ML_KEM_768, ML_KEM_1024)])
+    parser.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME,
+                        help="Seconds to keep sampling each primitive")
+    parser.add_argument('--only', nargs='*', default=None,
+                        help="Only run primitives whose name contains one of these strings")
+    parser.add_argument('--output', default=None, help="Write results as JSON to this file")
+    parser.add_argument('--baseline', default=None, help="JSON results file from an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative median slowdown counted as a regression")
+    args = parser.parse_args()
+
+    params = get_params(args.params)
+    print(f"Benchmarking primitives for {params.name} (min {args.min_time}s each):")
+    results = run_suite(params, args.min_time, args.only)
+
+    report = {
+        'meta': {
+            'params': params.name,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('params') != params.name:
+            print(f"Warning: baseline was recorded for {baseline.get('meta', {}).get('params')}")
+        regressions = compare_to_baseline(results, baseline['results'], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions.")
+
+if __name__ == "__main__":
+    main()
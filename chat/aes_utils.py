@@ -1,11 +1,56 @@
-
+import struct
+from typing import Tuple
 from Crypto.Cipher import AES
+from utils.hash_utils import sha3_256
+
+# 96-bit GCM nonce: 4 zero bytes followed by the 64-bit message counter
+NONCE = struct.Struct("!4xQ")
+TAG_BYTES = 16
+MAX_MESSAGES = 1 << 64
+
+CLIENT_TO_SERVER = b"kyber-chat client->server"
+SERVER_TO_CLIENT = b"kyber-chat server->client"
+
+def derive_session_key(K: bytes, label: bytes) -> bytes:
+    return sha3_256(label + K)
+
+class SecureSession:
+    """AES-256-GCM channel keyed from a 32-byte ML-KEM shared secret.
+
+    Each direction gets its own key, derived once from all of K, and a 64-bit
+    message counter that is used as the nonce. Nonces never go on the wire:
+    a replayed, dropped or reordered record is decrypted under the wrong
+    counter and fails authentication. Records must therefore be sent in the
+    order ``encrypt`` produced them.
+    """
+
+    def __init__(self, K: bytes, initiator: bool):
+        if len(K) != 32:
+            raise ValueError(f"Shared secret must be 32 bytes, got {len(K)}")
+        send_label, recv_label = (CLIENT_TO_SERVER, SERVER_TO_CLIENT) if initiator else (SERVER_TO_CLIENT, CLIENT_TO_SERVER)
+        self._send_key = derive_session_key(K, send_label)
+        self._recv_key = derive_session_key(K, recv_label)
+        self.sent = 0
+        self.received = 0
+
+    def encrypt(self, plaintext: bytes) -> Tuple[bytes, bytes]:
+        if self.sent >= MAX_MESSAGES:
+            raise ValueError("Send counter exhausted; start a new session")
+        cipher = AES.new(self._send_key, AES.MODE_GCM, nonce=NONCE.pack(self.sent))
+        self.sent += 1
+        return cipher.encrypt_and_digest(plaintext)
 
-def aes_encrypt(key: bytes, plaintext: bytes, nonce: bytes):
-    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
-    ciphertext, tag = cipher.encrypt_and_digest(plaintext)
-    return ciphertext, tag
+    def decrypt(self, ciphertext: bytes, tag: bytes) -> bytes:
+        """Decrypt the next record; raises ValueError if it fails authentication."""
+        if self.received >= MAX_MESSAGES:
+            raise ValueError("Receive counter exhausted; start a new session")
+        cipher = AES.new(self._recv_key, AES.MODE_GCM, nonce=NONCE.pack(self.received))
+        plaintext = cipher.decrypt_and_verify(ciphertext, tag)
+        self.received += 1
+        return plaintext
 
-def aes_decrypt(key: bytes, ciphertext: bytes, nonce: bytes, tag: bytes):
-    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
-    return cipher.decrypt_and_verify(ciphertext, tag)
+    def decrypt_record(self, record: bytes) -> bytes:
+        """Decrypt a ``ciphertext || tag`` record, e.g. a DATA frame payload."""
+        if len(record) < TAG_BYTES:
+            raise ValueError(f"Record of {len(record)} bytes is shorter than the GCM tag")
+        return self.decrypt(record[:-TAG_BYTES], record[-TAG_BYTES:])
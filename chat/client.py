@@ -1,6 +1,7 @@
+import argparse
+import asyncio
 import socket
 import os
-import threading
 import time
 import sys
 
@@ -8,82 +9,156 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from pke.params import ML_KEM_768
 from kem.encapsulate import ml_kem_encaps
-from Crypto.Cipher import AES
-
-def aes_encrypt(key: bytes, plaintext: bytes, nonce: bytes):
-    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
-    ciphertext, tag = cipher.encrypt_and_digest(plaintext)
-    return ciphertext, tag
-
-def aes_decrypt(key: bytes, ciphertext: bytes, nonce: bytes, tag: bytes):
-    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
-    return cipher.decrypt_and_verify(ciphertext, tag)
+from kem.keys import EncapsulationKey
+from chat.protocol import FramedSocket, FrameType
+from chat.aes_utils import SecureSession
+from chat.tickets import (LIFETIME, RESUME_NONCE_BYTES, ZERO_RTT_NONCE_BYTES, ClientTicketCache,
+                          resumed_shared_secret, resumption_secret, zero_rtt_shared_secret)
 
 HOST = '127.0.0.1'
 PORT = 65432
+ZERO_RTT = "0-RTT key exchange"
 
-def receive_messages(sock, K):
+async def receive_messages(conn, session, tickets, server, K):
     while True:
         try:
-            data = sock.recv(4096)
-            if not data:
-                break
-
-            nonce = data[:12]
-            ciphertext = data[12:-16]
-            tag = data[-16:]
+            frame = await conn.read_frame()
+            if frame is None:
+                print("\n[Server closed the connection]")
+                os._exit(0)
 
-            plaintext = aes_decrypt(K[:16], ciphertext, nonce, tag).decode()
+            frame_type, payload = frame
+            if frame_type == FrameType.TICKET:
+                lifetime, = LIFETIME.unpack_from(payload)
+                tickets.put(server, payload[LIFETIME.size:], resumption_secret(K), lifetime)
+                continue
+            if frame_type != FrameType.DATA:
+                raise ValueError(f"Unexpected frame type {frame_type}")
+            plaintext = session.decrypt_record(payload).decode()
 
             if plaintext.lower() == 'exit':
                 print("\n[Server ended the chat]")
                 os._exit(0)
 
-            import sys
             sys.stdout.write("\r" + " " * 80 + "\r")
-            print(f"[Server] {plaintext}")
+            print(plaintext)
             print("You: ", end="", flush=True)
 
         except Exception as e:
             print(f"\n[!] Receive error: {e}")
             break
 
-def send_messages(sock, K):
+async def send_messages(loop, conn, session):
     while True:
         try:
-            msg = input("You: ").strip()
+            # input() blocks, so it runs on a thread to keep receiving meanwhile
+            msg = (await loop.run_in_executor(None, input, "You: ")).strip()
             if msg.lower() == 'exit':
                 print("[You ended the chat]")
-                nonce = os.urandom(12)
-                ciphertext, tag = aes_encrypt(K[:16], b'exit', nonce)
-                sock.sendall(nonce + ciphertext + tag)
+                ciphertext, tag = session.encrypt(b'exit')
+                await conn.send_frame(FrameType.DATA, ciphertext, tag)
                 os._exit(0)
 
-            nonce = os.urandom(12)
-            ciphertext, tag = aes_encrypt(K[:16], msg.encode(), nonce)
-            sock.sendall(nonce + ciphertext + tag)
+            ciphertext, tag = session.encrypt(msg.encode())
+            await conn.send_frame(FrameType.DATA, ciphertext, tag)
 
         except Exception as e:
             print(f"[!] Send error: {e}")
             break
 
-def main():
+async def handshake(loop, conn, tickets, server, pinned_ek=None, first_message=None):
+    """Set up a session and return (K, session, kind of handshake).
+
+    A cached ticket is tried first. Otherwise, with a pinned server ek the
+    ciphertext (and ``first_message``, if given) goes out in the first flight
+    without waiting for the server; the session for everything after it is
+    keyed with the nonce in the server's ACCEPT. Without a pinned ek the
+    client runs the ephemeral ML-KEM exchange. ``first_message`` is only sent
+    early in 0-RTT mode.
+    """
+    cached = tickets.get(server)
+    if cached is not None:
+        ticket, secret = cached
+        client_nonce = os.urandom(RESUME_NONCE_BYTES)
+        await conn.send_frame(FrameType.RESUME, client_nonce, ticket)
+    elif pinned_ek is not None:
+        K, c = await loop.run_in_executor(None, ml_kem_encaps, pinned_ek, ML_KEM_768)
+        early = SecureSession(K, initiator=True).encrypt(first_message) if first_message is not None else ()
+        await conn.send_frame(FrameType.ZERO_RTT, c, *early)
+        server_nonce = await conn.expect_frame(FrameType.ACCEPT, ZERO_RTT_NONCE_BYTES)
+        K = zero_rtt_shared_secret(K, bytes(server_nonce))
+        return K, SecureSession(K, initiator=True), ZERO_RTT
+    else:
+        await conn.send_frame(FrameType.HELLO)
+
+    frame = await conn.read_frame()
+    if frame is None:
+        raise ConnectionError("Server closed the connection during the handshake.")
+    frame_type, payload = frame
+    if frame_type == FrameType.RESUMED and cached is not None:
+        if len(payload) != RESUME_NONCE_BYTES:
+            raise ValueError(f"RESUMED frame must be {RESUME_NONCE_BYTES} bytes, got {len(payload)}")
+        K = resumed_shared_secret(secret, client_nonce, bytes(payload))
+        return K, SecureSession(K, initiator=True), "Session resumption"
+    if frame_type != FrameType.EK or len(payload) != ML_KEM_768.pk_bytes:
+        raise ValueError(f"Expected a {ML_KEM_768.pk_bytes} byte EK frame, got type {frame_type}")
+    # The server turned the ticket down (expired or rotated out), so drop it
+    tickets.discard(server)
+
+    ek = bytes(payload)
+    K, c = await loop.run_in_executor(None, ml_kem_encaps, ek, ML_KEM_768)
+    await conn.send_frame(FrameType.CIPHERTEXT, c)
+    return K, SecureSession(K, initiator=True), "Key exchange"
+
+def load_pinned_ek(path, params=ML_KEM_768):
+    with open(path, 'rb') as f:
+        ek = f.read()
+    # Expanded once here, so each 0-RTT encapsulation skips parsing and sampling A
+    return EncapsulationKey.from_bytes(ek, params)
+
+async def main(host=HOST, port=PORT, ticket_file=None, server_ek=None):
+    loop = asyncio.get_running_loop()
+    tickets = ClientTicketCache(ticket_file)
+    pinned_ek = load_pinned_ek(server_ek) if server_ek is not None else None
+    server = f"{host}:{port}"
+    first_message = None
+    if pinned_ek is not None:
+        # In 0-RTT mode the first line rides in the first flight with the ciphertext
+        print("[Type 'exit' to end chat]\n")
+        first_message = (await loop.run_in_executor(None, input, "You: ")).strip()
+        if first_message.lower() == 'exit':
+            print("[You ended the chat]")
+            return
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.connect((HOST, PORT))
-
-        ek = s.recv(ML_KEM_768.pk_bytes)
+        s.setblocking(False)
+        await loop.sock_connect(s, (host, port))
+        conn = FramedSocket(loop, s)
 
         start_time = time.perf_counter()
-        K, c = ml_kem_encaps(ek, ML_KEM_768)
-        s.sendall(c)
+        early = first_message.encode() if first_message is not None else None
+        K, session, kind = await handshake(loop, conn, tickets, server, pinned_ek, early)
         end_time = time.perf_counter()
 
-        print(f"[+] Key exchange complete. Time taken: {(end_time - start_time)*1000:.2f} ms")
+        print(f"[+] {kind} complete. Time taken: {(end_time - start_time)*1000:.2f} ms")
         print(f"[+] Derived shared key (hex): {K.hex()}")
-        print("[Type 'exit' to end chat]\n")
+        if early is not None and kind != ZERO_RTT:
+            # A cached ticket was used instead, so the first line goes out now
+            ciphertext, tag = session.encrypt(early)
+            await conn.send_frame(FrameType.DATA, ciphertext, tag)
+        if pinned_ek is None:
+            print("[Type 'exit' to end chat]\n")
 
-        threading.Thread(target=receive_messages, args=(s, K), daemon=True).start()
-        send_messages(s, K)
+        receiver = asyncio.create_task(receive_messages(conn, session, tickets, server, K))
+        await send_messages(loop, conn, session)
+        receiver.cancel()
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="ML-KEM secured chat client")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--ticket-file', default=None,
+                        help="Keep session resumption tickets in this file to skip ML-KEM on reconnect")
+    parser.add_argument('--server-ek', default=None, metavar='PATH',
+                        help="Pin the server's static ek from PATH and connect in 0-RTT mode")
+    args = parser.parse_args()
+    asyncio.run(main(args.host, args.port, args.ticket_file, args.server_ek))
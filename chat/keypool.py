@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+from pke.params import MLKEMParams, ML_KEM_768
+from kem.keygen import ml_kem_keygen, ml_kem_keygen_batch
+
+class KeypairPool:
+    """Ephemeral ML-KEM keypairs generated ahead of time by a background thread.
+
+    The refill thread wakes when the pool drops below ``low_watermark`` and
+    tops it up to ``high_watermark`` in batches. If an ``executor``
+    (kem.executor.KEMExecutor) is given, keygen runs in its worker processes
+    instead of competing with the server for the GIL. Every keypair is handed
+    out by ``pop()`` exactly once. A failed refill (for example a broken or
+    shut-down executor) is logged, counted in ``stats()`` and retried after
+    ``retry_delay`` seconds.
+    """
+
+    def __init__(self, params: MLKEMParams = ML_KEM_768, low_watermark: int = 4,
+                 high_watermark: int = 16, batch_size: int = 4, executor=None,
+                 retry_delay: float = 1.0):
+        if not (1 <= low_watermark < high_watermark):
+            raise ValueError(f"Watermarks must satisfy 1 <= low < high, got {low_watermark}, {high_watermark}")
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be at least 1, got {batch_size}")
+        if retry_delay <= 0:
+            raise ValueError(f"retry_delay must be positive, got {retry_delay}")
+        self.params = params
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self._executor = executor
+        self._keypairs = deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        self.generated = 0
+        self.served = 0
+        self.waits = 0
+        self.refills = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+    def start(self) -> "KeypairPool":
+        with self._cond:
+            if self._thread is None:
+                self._stopped = False
+                self._thread = threading.Thread(target=self._refill_loop, name="keypair-pool", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+    def pop(self) -> Tuple[bytes, bytes]:
+        """Take a ready (ek, dk); generates one inline if the pool is empty."""
+        with self._cond:
+            if self._keypairs:
+                keypair = self._keypairs.popleft()
+            else:
+                keypair = None
+                self.waits += 1
+            self.served += 1
+            if len(self._keypairs) < self.low_watermark:
+                self._cond.notify_all()
+        if keypair is None:
+            keypair = ml_kem_keygen(self.params)
+            with self._cond:
+                self.generated += 1
+        return keypair
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._keypairs)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                'depth': len(self._keypairs),
+                'low_watermark': self.low_watermark,
+                'high_watermark': self.high_watermark,
+                'generated': self.generated,
+                'served': self.served,
+                'waits': self.waits,
+                'refills': self.refills,
+                'errors': self.errors,
+            }
+
+    def __enter__(self) -> "KeypairPool":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+    def _refill_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopped and len(self._keypairs) >= self.low_watermark:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                self.refills += 1
+            while True:
+                with self._cond:
+                    missing = self.high_watermark - len(self._keypairs)
+                    if self._stopped or missing <= 0:
+                        break
+                try:
+                    keypairs = self._generate(min(missing, self.batch_size))
+                except Exception as e:
+                    self._refill_failed(e)
+                    continue
+                with self._cond:
+                    self._keypairs.extend(keypairs)
+                    self.generated += len(keypairs)
+
+    def _refill_failed(self, e: Exception) -> None:
+        error = f"{type(e).__name__}: {e}"
+        print(f"[!] Keypair pool refill failed, retrying in {self.retry_delay:g}s: {error}")
+        deadline = time.monotonic() + self.retry_delay
+        with self._cond:
+            self.errors += 1
+            self.last_error = error
+            # Woken early by stop(); pops only ask for a refill, which is already running
+            while not self._stopped and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+
+    def _generate(self, n: int):
+        if self._executor is not None:
+            return [f.result() for f in self._executor.keygen(self.params, n)]
+        return ml_kem_keygen_batch(self.params, n)
@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat.client import HOST, PORT, handshake, load_pinned_ek
+from chat.protocol import FramedSocket, FrameType
+from chat.tickets import LIFETIME, ClientTicketCache, resumption_secret
+from utils.stats import summarize
+
+class LoadStats:
+    def __init__(self):
+        self.handshake_ms = {}
+        self.message_ms = []
+        self.errors = Counter()
+        self.attempted = 0
+        self.succeeded = 0
+        self.payload_bytes = 0
+
+    def report(self, config, duration):
+        messages = len(self.message_ms)
+        handshakes = sum(len(times) for times in self.handshake_ms.values())
+        return {
+            'config': config,
+            'duration_s': duration,
+            'connections': {
+                'attempted': self.attempted,
+                'succeeded': self.succeeded,
+                'failed': self.attempted - self.succeeded,
+            },
+            'errors': dict(self.errors),
+            'handshake_ms': {kind: summarize(times) for kind, times in self.handshake_ms.items()},
+            'message_rtt_ms': summarize(self.message_ms),
+            'throughput': {
+                'handshakes_per_s': handshakes / duration if duration else 0.0,
+                'messages_per_s': messages / duration if duration else 0.0,
+                'payload_bytes_per_s': self.payload_bytes / duration if duration else 0.0,
+            },
+        }
+
+async def read_ticket(conn, tickets, server, K):
+    # The server sends TICKET once its side of the handshake is done, so this
+    # is also where the handshake latency stops
+    frame = await conn.read_frame()
+    if frame is None:
+        raise ConnectionError("Server closed the connection during the handshake.")
+    frame_type, payload = frame
+    if frame_type != FrameType.TICKET:
+        raise ValueError(f"Expected TICKET frame, got type {frame_type}")
+    lifetime, = LIFETIME.unpack_from(payload)
+    tickets.put(server, payload[LIFETIME.size:], resumption_secret(K), lifetime)
+
+async def run_connection(loop, args, tickets, pinned_ek, stats):
+    server = f"{args.host}:{args.port}"
+    start_time = time.perf_counter()
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setblocking(False)
+        await loop.sock_connect(s, (args.host, args.port))
+        conn = FramedSocket(loop, s)
+        K, session, kind = await handshake(loop, conn, tickets, server, pinned_ek)
+        await read_ticket(conn, tickets, server, K)
+        stats.handshake_ms.setdefault(kind, []).append((time.perf_counter() - start_time) * 1000)
+
+        message = os.urandom(args.size)
+        for _ in range(args.messages):
+            sent_time = time.perf_counter()
+            ciphertext, tag = session.encrypt(message)
+            await conn.send_frame(FrameType.PING, ciphertext, tag)
+            reply = await conn.expect_frame(FrameType.PONG)
+            if session.decrypt_record(reply) != message:
+                raise ValueError("Echoed message does not match what was sent")
+            stats.message_ms.append((time.perf_counter() - sent_time) * 1000)
+            stats.payload_bytes += len(message)
+
+async def run_client(loop, index, args, pinned_ek, stats):
+    if args.rate > 0:
+        await asyncio.sleep(index / args.rate)
+    tickets = ClientTicketCache()
+    for _ in range(1 + args.reconnects):
+        stats.attempted += 1
+        try:
+            await asyncio.wait_for(run_connection(loop, args, tickets, pinned_ek, stats), args.timeout)
+            stats.succeeded += 1
+        except Exception as e:
+            stats.errors[type(e).__name__] += 1
+            return
+
+async def run_load(args):
+    loop = asyncio.get_running_loop()
+    pinned_ek = load_pinned_ek(args.server_ek) if args.server_ek is not None else None
+    stats = LoadStats()
+    start_time = time.perf_counter()
+    await asyncio.gather(*(run_client(loop, i, args, pinned_ek, stats) for i in range(args.connections)))
+    duration = time.perf_counter() - start_time
+    config = {
+        'host': args.host,
+        'port': args.port,
+        'connections': args.connections,
+        'rate': args.rate,
+        'messages': args.messages,
+        'size': args.size,
+        'reconnects': args.reconnects,
+        'mode': '0-rtt' if pinned_ek is not None else 'ephemeral',
+    }
+    return stats.report(config, duration)
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless load generator for the ML-KEM chat server")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('-n', '--connections', type=int, default=50,
+                        help="Concurrent simulated clients")
+    parser.add_argument('--rate', type=float, default=0,
+                        help="New clients per second (0: start them all at once)")
+    parser.add_argument('-m', '--messages', type=int, default=10,
+                        help="Echoed messages per connection")
+    parser.add_argument('--size', type=int, default=256,
+                        help="Message size in bytes")
+    parser.add_argument('--reconnects', type=int, default=0,
+                        help="Reconnect each client this many times, resuming with its ticket")
+    parser.add_argument('--server-ek', default=None, metavar='PATH',
+                        help="Pin the server's static ek and connect in 0-RTT mode")
+    parser.add_argument('--timeout', type=float, default=30,
+                        help="Seconds allowed per connection before it counts as an error")
+    parser.add_argument('--output', default=None, help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = json.dumps(asyncio.run(run_load(args)), indent=2)
+    print(report)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import asyncio
+import socket
+import struct
+from enum import IntEnum
+from typing import Optional, Tuple
+
+# Every record is: payload length (4 bytes, big-endian) | frame type (1 byte) | payload
+HEADER = struct.Struct("!IB")
+MAX_PAYLOAD = 1 << 20
+RECV_BUFFER_BYTES = 64 * 1024
+HAS_SENDMSG = hasattr(socket.socket, "sendmsg")
+
+class FrameType(IntEnum):
+    EK = 1
+    CIPHERTEXT = 2
+    DATA = 3
+    HELLO = 4
+    RESUME = 5
+    RESUMED = 6
+    TICKET = 7
+    ZERO_RTT = 8
+    PING = 9
+    PONG = 10
+    ACCEPT = 11
+
+class FramedSocket:
+    """Length-prefixed framing over a non-blocking socket.
+
+    Incoming bytes are read with ``recv_into`` into one reusable buffer and
+    frames are returned as ``memoryview`` slices of it, so a payload is only
+    valid until the next ``read_frame`` call. Outgoing frames are written with
+    scatter/gather ``sendmsg`` so header and payload parts are never joined.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, sock: socket.socket,
+                 bufsize: int = RECV_BUFFER_BYTES):
+        sock.setblocking(False)
+        self.loop = loop
+        self.sock = sock
+        self._buf = bytearray(bufsize)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+        self._send_lock = asyncio.Lock()
+
+    async def read_frame(self) -> Optional[Tuple[int, memoryview]]:
+        """Return (frame type, payload), or None on a clean close between frames."""
+        if not await self._fill_to(HEADER.size):
+            return None
+        length, frame_type = HEADER.unpack_from(self._buf, self._start)
+        if length > MAX_PAYLOAD:
+            raise ValueError(f"Frame of {length} bytes exceeds the {MAX_PAYLOAD} byte limit")
+        total = HEADER.size + length
+        if not await self._fill_to(total):
+            raise ConnectionError("Connection closed in the middle of a frame.")
+        payload = self._view[self._start + HEADER.size:self._start + total]
+        self._start += total
+        return frame_type, payload
+
+    async def expect_frame(self, frame_type: FrameType, length: Optional[int] = None) -> memoryview:
+        frame = await self.read_frame()
+        if frame is None:
+            raise ConnectionError("Connection closed before the expected frame was received.")
+        received_type, payload = frame
+        if received_type != frame_type:
+            raise ValueError(f"Expected {frame_type.name} frame, got type {received_type}")
+        if length is not None and len(payload) != length:
+            raise ValueError(f"{frame_type.name} frame must be {length} bytes, got {len(payload)}")
+        return payload
+
+    async def send_frame(self, frame_type: FrameType, *parts) -> None:
+        length = sum(len(part) for part in parts)
+        if length > MAX_PAYLOAD:
+            raise ValueError(f"Frame of {length} bytes exceeds the {MAX_PAYLOAD} byte limit")
+        buffers = [HEADER.pack(length, frame_type), *parts]
+        async with self._send_lock:
+            if not HAS_SENDMSG:
+                await self.loop.sock_sendall(self.sock, b"".join(buffers))
+                return
+            await self._sendmsg_all(buffers)
+
+    def close(self) -> None:
+        self.sock.close()
+
+    async def _fill_to(self, needed: int) -> bool:
+        if self._start == self._end:
+            self._start = self._end = 0
+        while self._end - self._start < needed:
+            if self._start + needed > len(self._buf):
+                self._make_room(needed)
+            n = await self.loop.sock_recv_into(self.sock, self._view[self._end:])
+            if n == 0:
+                if self._end != self._start:
+                    raise ConnectionError("Connection closed in the middle of a frame.")
+                return False
+            self._end += n
+        return True
+
+    def _make_room(self, needed: int) -> None:
+        pending = self._end - self._start
+        if needed > len(self._buf):
+            # Earlier payload views keep the old buffer alive, so swap rather than resize
+            buf = bytearray(max(needed, 2 * len(self._buf)))
+            buf[:pending] = self._view[self._start:self._end]
+            self._buf = buf
+            self._view = memoryview(buf)
+        else:
+            self._buf[:pending] = self._buf[self._start:self._end]
+        self._start = 0
+        self._end = pending
+
+    async def _sendmsg_all(self, buffers: list) -> None:
+        buffers = [buffer for buffer in buffers if len(buffer)]
+        while buffers:
+            try:
+                sent = self.sock.sendmsg(buffers)
+            except (BlockingIOError, InterruptedError):
+                await self._wait_writable()
+                continue
+            while sent:
+                head = buffers[0]
+                if sent >= len(head):
+                    sent -= len(head)
+                    buffers.pop(0)
+                else:
+                    buffers[0] = memoryview(head)[sent:]
+                    sent = 0
+
+    async def _wait_writable(self) -> None:
+        fd = self.sock.fileno()
+        writable = self.loop.create_future()
+        self.loop.add_writer(fd, lambda: writable.done() or writable.set_result(None))
+        try:
+            await writable
+        finally:
+            self.loop.remove_writer(fd)
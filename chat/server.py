@@ -1,5 +1,7 @@
+import argparse
+import asyncio
+import multiprocessing
 import socket
-import threading
 import time
 import os
 import sys
@@ -7,101 +9,253 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from pke.params import ML_KEM_768
+from kem.executor import KEMExecutor
 from kem.keygen import ml_kem_keygen
-from kem.decapsulate import ml_kem_decaps
-from Crypto.Cipher import AES
-
-def aes_encrypt(key: bytes, plaintext: bytes, nonce: bytes):
-    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
-    ciphertext, tag = cipher.encrypt_and_digest(plaintext)
-    return ciphertext, tag
-
-def aes_decrypt(key: bytes, ciphertext: bytes, nonce: bytes, tag: bytes):
-    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
-    return cipher.decrypt_and_verify(ciphertext, tag)
+from kem.keys import DecapsulationKey
+from chat.keypool import KeypairPool
+from chat.protocol import FramedSocket, FrameType
+from chat.aes_utils import SecureSession
+from chat.tickets import (LIFETIME, RESUME_NONCE_BYTES, ZERO_RTT_NONCE_BYTES, ReplayCache, TicketKeyStore,
+                          resumed_shared_secret, resumption_secret, zero_rtt_shared_secret)
 
 HOST = '127.0.0.1'
 PORT = 65432
+POOL_LOW_WATERMARK = 2
+POOL_HIGH_WATERMARK = 8
+TICKET_LIFETIME = 3600
+
+class ChatServer:
+    """Accepts many concurrent clients, each with its own ML-KEM handshake and
+    AES-GCM session, and relays every client's messages to all the others.
+
+    Keygen (through the keypair pool) and decapsulation run in a KEMExecutor's
+    worker processes so a slow handshake never blocks the event loop. After
+    every handshake the client gets a resumption ticket; presenting it on
+    reconnect derives a fresh session key with no KEM operation at all.
 
-def recv_exact(sock, n):
-    data = b''
-    while len(data) < n:
-        chunk = sock.recv(n - len(data))
-        if not chunk:
-            raise ConnectionError("Connection closed before expected bytes were received.")
-        data += chunk
-    return data
-
-def receive_messages(conn, K):
-    while True:
+    With a ``static_dk`` the server also accepts 0-RTT connections from clients
+    that pinned the matching ek: their first flight already carries the
+    ciphertext (and optionally the first message), decapsulated under the
+    static key that every worker expanded once at startup. Only that first
+    message is keyed from the ciphertext alone; the server answers with a
+    fresh nonce that keys the rest of the session, and refuses ciphertexts it
+    has recently seen.
+    """
+
+    def __init__(self, params=ML_KEM_768, workers=None, ticket_lifetime=TICKET_LIFETIME, static_dk=None):
+        self.params = params
+        self.static_key = DecapsulationKey.from_bytes(static_dk, params) if static_dk is not None else None
+        preload = [(static_dk, params)] if static_dk is not None else ()
+        self.executor = KEMExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                    preload=preload)
+        self.pool = KeypairPool(params, low_watermark=POOL_LOW_WATERMARK,
+                                high_watermark=POOL_HIGH_WATERMARK, executor=self.executor)
+        self.tickets = TicketKeyStore(lifetime=ticket_lifetime)
+        self.replays = ReplayCache()
+        self.clients = {}
+
+    async def serve(self, host=HOST, port=PORT, console=True):
+        loop = asyncio.get_running_loop()
+        self.pool.start()
+        tasks = set()
         try:
-            data = conn.recv(4096)
-            if not data:
-                break
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                s.bind((host, port))
+                s.listen()
+                s.setblocking(False)
+                print(f"[+] Server listening on {host}:{port}")
+                if console:
+                    tasks.add(asyncio.create_task(self.read_console(loop)))
+                while True:
+                    conn, addr = await loop.sock_accept(s)
+                    task = asyncio.create_task(self.handle_client(loop, conn, addr))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.pool.stop()
+            self.executor.shutdown(wait=False, cancel_futures=True)
 
-            nonce = data[:12]
-            ciphertext = data[12:-16]
-            tag = data[-16:]
+    async def handshake(self, loop, conn):
+        start_time = time.perf_counter()
+        frame = await conn.read_frame()
+        if frame is None:
+            raise ConnectionError("Connection closed before the handshake.")
+        frame_type, payload = frame
+        K, early = None, None
+        if frame_type == FrameType.ZERO_RTT:
+            K, early = await self.zero_rtt_handshake(conn, payload)
+            kind = "0-RTT key exchange"
+        elif frame_type == FrameType.RESUME:
+            K = await self.resume(conn, payload)
+            kind = "Session resumption"
+        elif frame_type != FrameType.HELLO:
+            raise ValueError(f"Expected HELLO, RESUME or ZERO_RTT frame, got type {frame_type}")
 
-            plaintext = aes_decrypt(K[:16], ciphertext, nonce, tag).decode()
+        if K is None:
+            K = await self.full_handshake(loop, conn)
+            kind = "Key exchange"
+        end_time = time.perf_counter()
 
-            if plaintext.lower() == 'exit':
-                print("\n[Client ended the chat]")
-                os._exit(0)
+        ticket = self.tickets.issue(resumption_secret(K))
+        await conn.send_frame(FrameType.TICKET, LIFETIME.pack(int(self.tickets.lifetime)), ticket)
 
-            import sys
-            sys.stdout.write("\r" + " " * 80 + "\r")
-            print(f"[Client] {plaintext}")
-            print("You: ", end="", flush=True)
+        stats = self.pool.stats()
+        print(f"[+] {kind} complete. Time taken: {(end_time - start_time)*1000:.2f} ms")
+        print(f"[+] Keypair pool depth: {stats['depth']}, handshakes that waited for keygen: {stats['waits']}")
+        return K, early
 
-        except Exception as e:
-            print(f"\n[!] Receive error: {e}")
-            break
+    async def full_handshake(self, loop, conn):
+        # pop() only blocks when the pool is empty and it has to run keygen inline
+        ek, dk = await loop.run_in_executor(None, self.pool.pop)
+        await conn.send_frame(FrameType.EK, ek)
 
-def send_messages(conn, K):
-    while True:
-        try:
-            msg = input("You: ").strip()
-            if msg.lower() == 'exit':
-                print("[You ended the chat]")
-                nonce = os.urandom(12)
-                ciphertext, tag = aes_encrypt(K[:16], b'exit', nonce)
-                conn.sendall(nonce + ciphertext + tag)
-                os._exit(0)
+        c = bytes(await conn.expect_frame(FrameType.CIPHERTEXT, self.params.ct_bytes))
+        # The dk is used once, so keep it out of the workers' key cache where
+        # it would only push out other keys
+        return await asyncio.wrap_future(self.executor.decaps(dk, [c], self.params, cache=False)[0])
+
+    async def zero_rtt_handshake(self, conn, payload):
+        """Accept a ZERO_RTT frame (ct || optional first record); returns (K, first message or None)."""
+        if self.static_key is None:
+            raise ValueError("0-RTT handshake requested but the server has no static key")
+        ct_bytes = self.params.ct_bytes
+        if len(payload) < ct_bytes:
+            raise ValueError(f"ZERO_RTT frame must hold a {ct_bytes} byte ciphertext, got {len(payload)} bytes")
+        c = bytes(payload[:ct_bytes])
+        if not self.replays.add(c):
+            raise ValueError("Replayed 0-RTT ciphertext")
+        K = await asyncio.wrap_future(self.executor.decaps(self.static_key.dk, [c], self.params)[0])
+        early = None
+        if len(payload) > ct_bytes:
+            early = SecureSession(K, initiator=False).decrypt_record(payload[ct_bytes:])
+        server_nonce = os.urandom(ZERO_RTT_NONCE_BYTES)
+        await conn.send_frame(FrameType.ACCEPT, server_nonce)
+        return zero_rtt_shared_secret(K, server_nonce), early
 
-            nonce = os.urandom(12)
-            ciphertext, tag = aes_encrypt(K[:16], msg.encode(), nonce)
-            conn.sendall(nonce + ciphertext + tag)
+    async def resume(self, conn, payload):
+        """Accept a RESUME frame, or return None to fall back to a full handshake."""
+        client_nonce, ticket = bytes(payload[:RESUME_NONCE_BYTES]), payload[RESUME_NONCE_BYTES:]
+        secret = self.tickets.redeem(ticket) if len(client_nonce) == RESUME_NONCE_BYTES else None
+        if secret is None:
+            return None
+        server_nonce = os.urandom(RESUME_NONCE_BYTES)
+        await conn.send_frame(FrameType.RESUMED, server_nonce)
+        return resumed_shared_secret(secret, client_nonce, server_nonce)
 
+    async def handle_client(self, loop, conn, addr):
+        name = f"{addr[0]}:{addr[1]}"
+        print(f"[+] Connection from {name}")
+        conn = FramedSocket(loop, conn)
+        try:
+            K, early = await self.handshake(loop, conn)
+            session = SecureSession(K, initiator=False)
+            self.clients[name] = (conn, session)
+            if early is not None and not await self.relay(loop, name, early):
+                return
+            while True:
+                frame = await conn.read_frame()
+                if frame is None:
+                    break
+                frame_type, payload = frame
+                if frame_type == FrameType.PING:
+                    # Echoed to the sender only, re-encrypted; used by chat/loadgen.py
+                    await self.send_message(conn, session, session.decrypt_record(payload), FrameType.PONG)
+                    continue
+                if frame_type != FrameType.DATA:
+                    raise ValueError(f"Unexpected frame type {frame_type}")
+                if not await self.relay(loop, name, session.decrypt_record(payload)):
+                    break
+        except (ConnectionError, ValueError) as e:
+            print(f"[!] {name}: {e}")
         except Exception as e:
-            print(f"[!] Send error: {e}")
-            break
+            # A failed KEM worker or the like must not kill the task silently
+            print(f"[!] {name}: {type(e).__name__}: {e}")
+        finally:
+            self.clients.pop(name, None)
+            conn.close()
+            print(f"[-] {name} disconnected ({len(self.clients)} connected)")
+
+    async def relay(self, loop, name, message):
+        """Pass one decrypted client message on; returns False once the client says exit."""
+        plaintext = message.decode()
+        if plaintext.lower() == 'exit':
+            return False
+        print(f"[{name}] {plaintext}")
+        await self.broadcast(loop, f"[{name}] {plaintext}", exclude=name)
+        return True
 
-def handle_client(conn):
-    start_time = time.perf_counter()
-    ek, dk = ml_kem_keygen(ML_KEM_768)
-    conn.sendall(ek)
+    async def broadcast(self, loop, text, exclude=None):
+        sends = []
+        for name, (conn, session) in list(self.clients.items()):
+            if name == exclude:
+                continue
+            sends.append(self.send_message(conn, session, text))
+        await asyncio.gather(*sends, return_exceptions=True)
 
-    c = recv_exact(conn, ML_KEM_768.ct_bytes)
-    K = ml_kem_decaps(dk, c, ML_KEM_768)
-    end_time = time.perf_counter()
+    async def send_message(self, conn, session, message, frame_type=FrameType.DATA):
+        # Encrypting and queueing on the send lock happen in one step, so frames
+        # leave in counter order even when several broadcasts overlap
+        if isinstance(message, str):
+            message = message.encode()
+        ciphertext, tag = session.encrypt(message)
+        await conn.send_frame(frame_type, ciphertext, tag)
 
-    print(f"[+] Key exchange complete. Time taken: {(end_time - start_time)*1000:.2f} ms")
-    print(f"[+] Derived shared key (hex): {K.hex()}")
-    print("[Type 'exit' to end chat]\n")
+    async def read_console(self, loop):
+        print("[Type a message to broadcast it, 'exit' to stop the server]\n")
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if not line:
+                return
+            msg = line.strip()
+            if not msg:
+                continue
+            if msg.lower() == 'exit':
+                await self.broadcast(loop, 'exit')
+                print("[You stopped the server]")
+                os._exit(0)
+            await self.broadcast(loop, f"[Server] {msg}")
 
-    threading.Thread(target=receive_messages, args=(conn, K), daemon=True).start()
-    send_messages(conn, K)
+def load_static_keypair(path, params=ML_KEM_768):
+    """Read the server's static dk from ``path``, or create it and write its ek to ``path.pub``."""
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            dk = f.read()
+        if len(dk) != params.sk_bytes:
+            raise ValueError(f"{path} must hold a {params.sk_bytes} byte decapsulation key, got {len(dk)}")
+        return DecapsulationKey.from_bytes(dk, params).ek.ek, dk
+    ek, dk = ml_kem_keygen(params)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(dk)
+    with open(path + '.pub', 'wb') as f:
+        f.write(ek)
+    return ek, dk
 
 def start_server():
-    print(f"[+] Server listening on {HOST}:{PORT}")
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind((HOST, PORT))
-        s.listen()
-        conn, addr = s.accept()
-        with conn:
-            print(f"[+] Connection from {addr}")
-            handle_client(conn)
+    parser = argparse.ArgumentParser(description="ML-KEM secured multi-client chat server")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="KEM worker processes (default: number of CPUs)")
+    parser.add_argument('--ticket-lifetime', type=int, default=TICKET_LIFETIME,
+                        help="Seconds a session resumption ticket stays valid")
+    parser.add_argument('--static-key', default=None, metavar='PATH',
+                        help="Also accept 0-RTT clients using the static keypair in PATH "
+                             "(created on first use; its ek is written to PATH.pub)")
+    args = parser.parse_args()
+    static_dk = None
+    if args.static_key is not None:
+        _, static_dk = load_static_keypair(args.static_key, ML_KEM_768)
+        print(f"[+] 0-RTT enabled; clients pin {args.static_key}.pub")
+    server = ChatServer(ML_KEM_768, workers=args.workers, ticket_lifetime=args.ticket_lifetime,
+                        static_dk=static_dk)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
 
 if __name__ == '__main__':
     start_server()
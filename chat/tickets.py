@@ -0,0 +1,227 @@
+import json
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+from Crypto.Cipher import AES
+from utils.hash_utils import sha3_256
+
+# Ticket: key id | GCM nonce | AES-GCM(expiry | resumption secret) | tag
+KEY_ID_BYTES = 8
+TICKET_NONCE_BYTES = 12
+TAG_BYTES = 16
+SECRET_BYTES = 32
+EXPIRY = struct.Struct("!d")
+TICKET_BYTES = KEY_ID_BYTES + TICKET_NONCE_BYTES + EXPIRY.size + SECRET_BYTES + TAG_BYTES
+RESUME_NONCE_BYTES = 32
+ZERO_RTT_NONCE_BYTES = 32
+REPLAY_CACHE_SIZE = 16384
+
+# TICKET frame payload: lifetime in seconds | ticket
+LIFETIME = struct.Struct("!I")
+
+def resumption_secret(K: bytes) -> bytes:
+    return sha3_256(b"kyber-chat resumption" + K)
+
+def resumed_shared_secret(secret: bytes, client_nonce: bytes, server_nonce: bytes) -> bytes:
+    """Fresh 32-byte session secret for a resumed connection; no KEM involved."""
+    if len(client_nonce) != RESUME_NONCE_BYTES or len(server_nonce) != RESUME_NONCE_BYTES:
+        raise ValueError(f"Resumption nonces must be {RESUME_NONCE_BYTES} bytes")
+    return sha3_256(b"kyber-chat resume" + secret + client_nonce + server_nonce)
+
+def zero_rtt_shared_secret(K: bytes, server_nonce: bytes) -> bytes:
+    """Session secret for every record after the early one on a 0-RTT connection.
+
+    The early record is keyed from K alone, so it travels with the ciphertext
+    and can be replayed with it. Mixing in a nonce the server picks for each
+    connection means nothing recorded after the early record decrypts again.
+    """
+    if len(server_nonce) != ZERO_RTT_NONCE_BYTES:
+        raise ValueError(f"0-RTT server nonce must be {ZERO_RTT_NONCE_BYTES} bytes")
+    return sha3_256(b"kyber-chat 0-rtt" + K + server_nonce)
+
+class ReplayCache:
+    """Hashes of the last ``maxsize`` 0-RTT ciphertexts a server accepted.
+
+    A ZERO_RTT frame whose ciphertext is still in the cache is a replay. Older
+    entries are forgotten, and so is everything on restart, so this narrows
+    the replay window of the early record but does not close it.
+    """
+
+    def __init__(self, maxsize: int = REPLAY_CACHE_SIZE):
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be at least 1, got {maxsize}")
+        self.maxsize = maxsize
+        self._seen: "OrderedDict[bytes, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.replays = 0
+
+    def add(self, c: bytes) -> bool:
+        """Record ``c``; returns False if it was already seen."""
+        digest = sha3_256(bytes(c))
+        with self._lock:
+            if digest in self._seen:
+                self.replays += 1
+                return False
+            self._seen[digest] = None
+            if len(self._seen) > self.maxsize:
+                self._seen.popitem(last=False)
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._seen.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._seen)
+
+class TicketKeyStore:
+    """Server-side keys that seal and open session resumption tickets.
+
+    A new ticket key is started every ``rotation_interval`` seconds. Older
+    keys are kept only while tickets issued under them can still be valid
+    (``lifetime`` seconds), and never more than ``max_keys`` of them. A ticket
+    is an AES-GCM box holding the resumption secret and its expiry, so the
+    server keeps no per-client state.
+    """
+
+    def __init__(self, lifetime: float = 3600, rotation_interval: Optional[float] = None,
+                 max_keys: int = 4, clock: Callable[[], float] = time.monotonic):
+        if lifetime <= 0:
+            raise ValueError(f"lifetime must be positive, got {lifetime}")
+        if max_keys < 1:
+            raise ValueError(f"max_keys must be at least 1, got {max_keys}")
+        self.lifetime = lifetime
+        self.rotation_interval = rotation_interval or lifetime
+        self.max_keys = max_keys
+        self._clock = clock
+        # key id -> (key, created); the newest key is last and issues tickets
+        self._keys: "OrderedDict[bytes, Tuple[bytes, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.redeemed = 0
+        self.rejected = 0
+        self.rotations = 0
+
+    def issue(self, secret: bytes) -> bytes:
+        if len(secret) != SECRET_BYTES:
+            raise ValueError(f"Resumption secret must be {SECRET_BYTES} bytes, got {len(secret)}")
+        now = self._clock()
+        with self._lock:
+            key_id, key = self._current_key(now)
+            self.issued += 1
+        nonce = os.urandom(TICKET_NONCE_BYTES)
+        cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+        cipher.update(key_id)
+        sealed, tag = cipher.encrypt_and_digest(EXPIRY.pack(now + self.lifetime) + secret)
+        return key_id + nonce + sealed + tag
+
+    def redeem(self, ticket: bytes) -> Optional[bytes]:
+        """Return the resumption secret, or None if the ticket is unknown, forged or expired."""
+        now = self._clock()
+        ticket = bytes(ticket)
+        key_id = ticket[:KEY_ID_BYTES]
+        with self._lock:
+            self._expire(now)
+            entry = self._keys.get(key_id) if len(ticket) == TICKET_BYTES else None
+            if entry is None:
+                self.rejected += 1
+                return None
+        nonce = ticket[KEY_ID_BYTES:KEY_ID_BYTES + TICKET_NONCE_BYTES]
+        cipher = AES.new(entry[0], AES.MODE_GCM, nonce=nonce)
+        cipher.update(key_id)
+        try:
+            plaintext = cipher.decrypt_and_verify(ticket[KEY_ID_BYTES + TICKET_NONCE_BYTES:-TAG_BYTES],
+                                                  ticket[-TAG_BYTES:])
+        except ValueError:
+            plaintext = None
+        with self._lock:
+            if plaintext is None or EXPIRY.unpack_from(plaintext)[0] <= now:
+                self.rejected += 1
+                return None
+            self.redeemed += 1
+        return plaintext[EXPIRY.size:]
+
+    def rotate(self) -> None:
+        """Start a new ticket key now; tickets under older keys stay valid until they expire."""
+        with self._lock:
+            self._add_key(self._clock())
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'keys': len(self._keys),
+                'issued': self.issued,
+                'redeemed': self.redeemed,
+                'rejected': self.rejected,
+                'rotations': self.rotations,
+            }
+
+    def _current_key(self, now: float) -> Tuple[bytes, bytes]:
+        self._expire(now)
+        if not self._keys or now - next(reversed(self._keys.values()))[1] >= self.rotation_interval:
+            self._add_key(now)
+        key_id = next(reversed(self._keys))
+        return key_id, self._keys[key_id][0]
+
+    def _add_key(self, now: float) -> None:
+        self._keys[os.urandom(KEY_ID_BYTES)] = (os.urandom(32), now)
+        self.rotations += 1
+        while len(self._keys) > self.max_keys:
+            self._keys.popitem(last=False)
+
+    def _expire(self, now: float) -> None:
+        # A key stops issuing after rotation_interval; its last ticket expires lifetime later
+        horizon = self.rotation_interval + self.lifetime
+        while self._keys and now - next(iter(self._keys.values()))[1] >= horizon:
+            self._keys.popitem(last=False)
+
+class ClientTicketCache:
+    """Client-side resumption tickets and secrets, keyed by server address.
+
+    Entries expire after the lifetime the server announced. If ``path`` is
+    given the cache is kept in that file (readable by the owner only) so a
+    restarted client can still resume.
+    """
+
+    def __init__(self, path: Optional[str] = None, clock: Callable[[], float] = time.time):
+        self.path = path
+        self._clock = clock
+        self._entries: Dict[str, Tuple[bytes, bytes, float]] = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                for server, (ticket, secret, expiry) in json.load(f).items():
+                    self._entries[server] = (bytes.fromhex(ticket), bytes.fromhex(secret), expiry)
+
+    def get(self, server: str) -> Optional[Tuple[bytes, bytes]]:
+        entry = self._entries.get(server)
+        if entry is None:
+            return None
+        ticket, secret, expiry = entry
+        if expiry <= self._clock():
+            self.discard(server)
+            return None
+        return ticket, secret
+
+    def put(self, server: str, ticket: bytes, secret: bytes, lifetime: float) -> None:
+        self._entries[server] = (bytes(ticket), bytes(secret), self._clock() + lifetime)
+        self._save()
+
+    def discard(self, server: str) -> None:
+        if self._entries.pop(server, None) is not None:
+            self._save()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        data = {server: [ticket.hex(), secret.hex(), expiry]
+                for server, (ticket, secret, expiry) in self._entries.items()}
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
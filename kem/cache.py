@@ -0,0 +1,134 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Optional, Type, TypeVar, Union
+from pke.params import MLKEMParams
+from kem.keys import DecapsulationKey, EncapsulationKey
+
+class ExpansionCache(ABC):
+    """Bounded, thread-safe LRU cache of keys expanded from their bytes.
+
+    Entries are keyed by (parameter set, key bytes). An entry is evicted when
+    the cache grows past ``maxsize`` (least recently used first) or when it is
+    older than ``ttl`` seconds, if a TTL is set. Subclasses say how to expand
+    a key in ``_expand``.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be at least 1, got {maxsize}")
+        if ttl is not None and ttl <= 0:
+            raise ValueError(f"ttl must be positive, got {ttl}")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abstractmethod
+    def _expand(self, data: bytes, params: MLKEMParams) -> Any:
+        """Expanded form of ``data``; called on a miss, outside the lock."""
+
+    def get(self, data: bytes, params: MLKEMParams) -> Any:
+        key = (params.name, bytes(data))
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expanded, created = entry
+                if self.ttl is None or now - created < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return expanded
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+
+        # Expand outside the lock so other keys are not blocked meanwhile
+        expanded = self._expand(key[1], params)
+
+        with self._lock:
+            self._entries[key] = (expanded, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return expanded
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+class EncapsulationKeyCache(ExpansionCache):
+    """LRU cache of expanded encapsulation keys, keyed by (parameter set, ek bytes)."""
+
+    def _expand(self, ek: bytes, params: MLKEMParams) -> EncapsulationKey:
+        return EncapsulationKey.from_bytes(ek, params)
+
+class DecapsulationKeyCache(ExpansionCache):
+    """LRU cache of expanded decapsulation keys, keyed by (parameter set, dk bytes)."""
+
+    def _expand(self, dk: bytes, params: MLKEMParams) -> DecapsulationKey:
+        return DecapsulationKey.from_bytes(dk, params)
+
+CacheT = TypeVar("CacheT", bound=ExpansionCache)
+
+class DefaultCache(Generic[CacheT]):
+    """Process-wide default cache of one kind, off until enabled."""
+
+    def __init__(self, cache_type: Type[CacheT]):
+        self.cache_type = cache_type
+        self.cache: Optional[CacheT] = None
+
+    def enable(self, maxsize: int = 128, ttl: Optional[float] = None) -> CacheT:
+        self.cache = self.cache_type(maxsize=maxsize, ttl=ttl)
+        return self.cache
+
+    def disable(self) -> None:
+        self.cache = None
+
+    def get(self) -> Optional[CacheT]:
+        return self.cache
+
+_default_cache = DefaultCache(EncapsulationKeyCache)
+
+def enable_ek_cache(maxsize: int = 128, ttl: Optional[float] = None) -> EncapsulationKeyCache:
+    return _default_cache.enable(maxsize=maxsize, ttl=ttl)
+
+def disable_ek_cache() -> None:
+    _default_cache.disable()
+
+def get_ek_cache() -> Optional[EncapsulationKeyCache]:
+    return _default_cache.get()
+
+def expand_encapsulation_key(ek: Union[bytes, EncapsulationKey], params: MLKEMParams,
+                             cache: Optional[EncapsulationKeyCache] = None) -> EncapsulationKey:
+    if isinstance(ek, EncapsulationKey):
+        if ek.params != params:
+            raise ValueError(f"Encapsulation key is for {ek.params.name}, not {params.name}")
+        return ek
+    if len(ek) != params.pk_bytes:
+        raise ValueError(f"Encapsulation key must be {params.pk_bytes} bytes, got {len(ek)}")
+    cache = cache if cache is not None else _default_cache.get()
+    if cache is None:
+        return EncapsulationKey.from_bytes(ek, params)
+    return cache.get(ek, params)
@@ -0,0 +1,104 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple, Union
+from pke.params import MLKEMParams
+from kem.cache import DefaultCache, ExpansionCache
+from kem.keygen import ml_kem_keygen_internal, ml_kem_keygen_internal_expanded
+from kem.keys import DecapsulationKey
+from utils.hash_utils import H
+from utils.random_utils import random_bytes
+
+# Compact dk: d | z [| H(ek)]
+SEED_BYTES = 32
+HASH_BYTES = 32
+COMPACT_BYTES = 2 * SEED_BYTES
+COMPACT_BYTES_WITH_HASH = COMPACT_BYTES + HASH_BYTES
+
+@dataclass(frozen=True)
+class CompactDecapsulationKey:
+    """Decapsulation key stored as the (d, z) seeds it is generated from.
+
+    The full dk is rebuilt with ml_kem_keygen_internal when needed. ``h`` is
+    the H(ek) of the key, kept optionally so that a seed pair paired with the
+    wrong parameter set or a corrupted record is caught on expansion.
+    """
+    d: bytes
+    z: bytes
+    params: MLKEMParams
+    h: Optional[bytes] = None
+
+    def __post_init__(self):
+        if len(self.d) != SEED_BYTES or len(self.z) != SEED_BYTES:
+            raise ValueError(f"Seeds d and z must be {SEED_BYTES} bytes each")
+        if self.h is not None and len(self.h) != HASH_BYTES:
+            raise ValueError(f"H(ek) must be {HASH_BYTES} bytes, got {len(self.h)}")
+
+    @classmethod
+    def from_bytes(cls, data: bytes, params: MLKEMParams) -> "CompactDecapsulationKey":
+        if len(data) not in (COMPACT_BYTES, COMPACT_BYTES_WITH_HASH):
+            raise ValueError(f"Compact decapsulation key must be {COMPACT_BYTES} or "
+                             f"{COMPACT_BYTES_WITH_HASH} bytes, got {len(data)}")
+        data = bytes(data)
+        h = data[COMPACT_BYTES:] or None
+        return cls(d=data[:SEED_BYTES], z=data[SEED_BYTES:COMPACT_BYTES], params=params, h=h)
+
+    def to_bytes(self) -> bytes:
+        return self.d + self.z + (self.h or b"")
+
+    @property
+    def seed(self) -> bytes:
+        return self.d + self.z
+
+    def expand(self) -> Tuple[bytes, bytes]:
+        """Regenerate (ek, dk); raises ValueError if a stored H(ek) does not match."""
+        ek, dk = ml_kem_keygen_internal(self.d, self.z, self.params)
+        if self.h is not None and H(ek) != self.h:
+            raise ValueError("Compact decapsulation key does not match its stored H(ek)")
+        return ek, dk
+
+    def expand_key(self) -> DecapsulationKey:
+        """Regenerate the expanded key straight from keygen; same H(ek) check as ``expand``."""
+        key = ml_kem_keygen_internal_expanded(self.d, self.z, self.params)
+        if self.h is not None and key.h != self.h:
+            raise ValueError("Compact decapsulation key does not match its stored H(ek)")
+        return key
+
+def ml_kem_keygen_compact(params: MLKEMParams, store_hash: bool = True) -> Tuple[bytes, CompactDecapsulationKey]:
+    """Generate a key pair, keeping only the seeds of the decapsulation key."""
+    d, z = random_bytes(SEED_BYTES), random_bytes(SEED_BYTES)
+    ek, _ = ml_kem_keygen_internal(d, z, params)
+    return ek, CompactDecapsulationKey(d=d, z=z, params=params, h=H(ek) if store_hash else None)
+
+class CompactKeyCache(ExpansionCache):
+    """LRU cache of expanded decapsulation keys, keyed by (parameter set, compact key bytes).
+
+    Each miss costs one key generation; each entry holds the full dk and its
+    expanded form, so ``maxsize`` bounds how much of the saving is given back.
+    """
+
+    def _expand(self, data: bytes, params: MLKEMParams) -> DecapsulationKey:
+        return CompactDecapsulationKey.from_bytes(data, params).expand_key()
+
+_default_cache = DefaultCache(CompactKeyCache)
+
+def enable_compact_key_cache(maxsize: int = 128, ttl: Optional[float] = None) -> CompactKeyCache:
+    return _default_cache.enable(maxsize=maxsize, ttl=ttl)
+
+def disable_compact_key_cache() -> None:
+    _default_cache.disable()
+
+def get_compact_key_cache() -> Optional[CompactKeyCache]:
+    return _default_cache.get()
+
+def expand_compact_key(key: Union[bytes, CompactDecapsulationKey], params: MLKEMParams,
+                       cache: Optional[CompactKeyCache] = None) -> DecapsulationKey:
+    """Expanded decapsulation key for a compact key, through ``cache`` or the default cache if enabled."""
+    if isinstance(key, CompactDecapsulationKey):
+        if key.params != params:
+            raise ValueError(f"Compact decapsulation key is for {key.params.name}, not {params.name}")
+        data = key.to_bytes()
+    else:
+        data = bytes(key)
+    cache = cache if cache is not None else _default_cache.get()
+    if cache is None:
+        return CompactDecapsulationKey.from_bytes(data, params).expand_key()
+    return cache.get(data, params)
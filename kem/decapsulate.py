@@ -1,36 +1,58 @@
 from pke.params import MLKEMParams
-from pke.decrypt import k_pke_decrypt
-from pke.encrypt import k_pke_encrypt
-from utils.hash_utils import H, J, G
-from typing import Tuple
+from pke.decrypt import k_pke_decrypt_batch
+from pke.encrypt import k_pke_encrypt_batch
+from kem.keys import DecapsulationKey
+from kem.compact import CompactDecapsulationKey, expand_compact_key
+from utils.hash_utils import J, G
+from utils.instrumentation import stage
+from typing import List, Union
 
-def ml_kem_decaps(dk: bytes, c: bytes, params: MLKEMParams) -> bytes:
+DecapsulationKeyLike = Union[bytes, DecapsulationKey, CompactDecapsulationKey]
 
-    if len(dk) != params.sk_bytes:
+def ml_kem_decaps(dk: DecapsulationKeyLike, c: bytes, params: MLKEMParams) -> bytes:
+    return ml_kem_decaps_batch(dk, [c], params)[0]
+
+def ml_kem_decaps_batch(dk: DecapsulationKeyLike, cs: List[bytes], params: MLKEMParams) -> List[bytes]:
+
+    if isinstance(dk, (DecapsulationKey, CompactDecapsulationKey)):
+        if dk.params != params:
+            raise ValueError(f"Decapsulation key is for {dk.params.name}, not {params.name}")
+    elif not isinstance(dk, (bytes, bytearray, memoryview)):
+        raise TypeError(f"Decapsulation key must be bytes-like or a DecapsulationKey, got {type(dk).__name__}")
+    elif len(dk) != params.sk_bytes:
         raise ValueError(f"Decapsulation key must be {params.sk_bytes} bytes, got {len(dk)}")
-    if len(c) != params.ct_bytes:
-        raise ValueError(f"Ciphertext must be {params.ct_bytes} bytes, got {len(c)}")
-    
-    dk_pke, ek_pke, h_ek_pke, z = parse_decapsulation_key(dk, params)
-    
-    m_prime = k_pke_decrypt(dk_pke, c, params)
-    
-    g_input = m_prime + h_ek_pke
-    g_output = G(g_input)  
-    
-    K_prime = g_output[:32]   
-    r_prime = g_output[32:64] 
-    
-    
-    c_prime = k_pke_encrypt(ek_pke, m_prime, r_prime, params)
-    
-    
-    if constant_time_compare(c, c_prime):
-        return K_prime
-    else:
-        rejection_input = z + c
-        K_rejection = J(rejection_input)
-        return K_rejection
+    for c in cs:
+        if len(c) != params.ct_bytes:
+            raise ValueError(f"Ciphertext must be {params.ct_bytes} bytes, got {len(c)}")
+    if not cs:
+        return []
+    
+    with stage("kem.decaps"):
+        with stage("expand_key"):
+            if isinstance(dk, CompactDecapsulationKey):
+                key = expand_compact_key(dk, params)
+            else:
+                key = dk if isinstance(dk, DecapsulationKey) else DecapsulationKey.from_bytes(dk, params)
+        
+        m_primes = k_pke_decrypt_batch(key.s_hat_mul, cs, params)
+        
+        with stage("hash"):
+            g_outputs = [G(m_prime + key.h) for m_prime in m_primes]
+        
+        r_primes = [g_output[32:64] for g_output in g_outputs]
+        
+        with stage("reencrypt"):
+            c_primes = k_pke_encrypt_batch(key.ek.t_hat_mul, key.ek.A_hat_mul, m_primes, r_primes, params)
+        
+        with stage("compare"):
+            results = []
+            for c, c_prime, g_output in zip(cs, c_primes, g_outputs):
+                if constant_time_compare(c, c_prime):
+                    results.append(g_output[:32])
+                else:
+                    rejection_input = key.z + c
+                    results.append(J(rejection_input))
+            return results
 
 def constant_time_compare(a: bytes, b: bytes) -> bool:
  
@@ -41,27 +63,4 @@ def constant_time_compare(a: bytes, b: bytes) -> bool:
     for x, y in zip(a, b):
         result |= x ^ y
     
-    return result == 0 
-
-def parse_decapsulation_key(dk: bytes, params: MLKEMParams) -> Tuple[bytes, bytes, bytes, bytes]:
-    
-    expected_length = params.sk_bytes
-    if len(dk) != expected_length:
-        raise ValueError(f"Decapsulation key must be {expected_length} bytes, got {len(dk)}")
-    
-    offset = 0
-    
-    dk_pke_len = 384 * params.k
-    dk_pke = dk[offset:offset + dk_pke_len]
-    offset += dk_pke_len
-    
-    ek_pke_len = params.pk_bytes
-    ek_pke = dk[offset:offset + ek_pke_len]
-    offset += ek_pke_len
-    
-    ek_pke_hash = dk[offset:offset + 32]
-    offset += 32
-    
-    z = dk[offset:offset + 32]
-    
-    return dk_pke, ek_pke, ek_pke_hash, z
+    return result == 0
@@ -1,31 +1,76 @@
-from typing import Tuple
+from typing import List, Optional, Sequence, Tuple, Union
 from pke.params import MLKEMParams
-from pke.encrypt import k_pke_encrypt
-from utils.hash_utils import H, J, G
+from pke.encrypt import k_pke_encrypt_expanded, k_pke_encrypt_batch
+from kem.cache import EncapsulationKeyCache, expand_encapsulation_key
+from kem.keys import EncapsulationKey
+from utils.hash_utils import G
 from utils.random_utils import random_bytes
+from utils.instrumentation import stage
+from utils.poly_utils import stack_mulcaches
 
-def ml_kem_encaps(ek: bytes, params: MLKEMParams) -> Tuple[bytes, bytes]:
-    if len(ek) != params.pk_bytes:
-        raise ValueError(f"Encapsulation key must be {params.pk_bytes} bytes, got {len(ek)}")
-    m = random_bytes(32)
-    ek_hash = H(ek)
-    g_input = m + ek_hash
-    g_output = G(g_input)
-    K = g_output[:32]
-    r = g_output[32:64]
-    c = k_pke_encrypt(ek, m, r, params)
-    return K, c
+EncapsulationKeyLike = Union[bytes, EncapsulationKey]
+
+def ml_kem_encaps(ek: EncapsulationKeyLike, params: MLKEMParams,
+                  cache: Optional[EncapsulationKeyCache] = None) -> Tuple[bytes, bytes]:
+    with stage("kem.encaps"):
+        key = expand_encapsulation_key(ek, params, cache)
+        m = random_bytes(32)
+        return _encaps(key, m, params)
 
-def ml_kem_encaps_deterministic(ek: bytes, m: bytes, params: MLKEMParams) -> Tuple[bytes, bytes]:
-    if len(ek) != params.pk_bytes:
-        raise ValueError(f"Encapsulation key must be {params.pk_bytes} bytes, got {len(ek)}")
+def ml_kem_encaps_deterministic(ek: EncapsulationKeyLike, m: bytes, params: MLKEMParams,
+                                cache: Optional[EncapsulationKeyCache] = None) -> Tuple[bytes, bytes]:
     if len(m) != 32:
         raise ValueError(f"Message must be exactly 32 bytes, got {len(m)}")
-    ek_hash = H(ek)
-    g_input = m + ek_hash
-    g_output = G(g_input)
+    with stage("kem.encaps"):
+        return _encaps(expand_encapsulation_key(ek, params, cache), m, params)
+
+def ml_kem_encaps_batch(ek_or_eks: Union[EncapsulationKeyLike, Sequence[EncapsulationKeyLike]],
+                        params: MLKEMParams, n: Optional[int] = None,
+                        cache: Optional[EncapsulationKeyCache] = None) -> List[Tuple[bytes, bytes]]:
+    """Encapsulate n times to one key, or once to each key in a sequence."""
+    if isinstance(ek_or_eks, (bytes, bytearray, memoryview, EncapsulationKey)):
+        if n is None:
+            raise ValueError("n is required when encapsulating to a single key")
+        count = n
+    else:
+        if n is not None and n != len(ek_or_eks):
+            raise ValueError(f"n={n} does not match the {len(ek_or_eks)} keys given")
+        count = len(ek_or_eks)
+    if count < 0:
+        raise ValueError(f"Batch size must be non-negative, got {count}")
+    ms = [random_bytes(32) for _ in range(count)]
+    return ml_kem_encaps_batch_deterministic(ek_or_eks, ms, params, cache)
+
+def ml_kem_encaps_batch_deterministic(ek_or_eks: Union[EncapsulationKeyLike, Sequence[EncapsulationKeyLike]],
+                                      ms: List[bytes], params: MLKEMParams,
+                                      cache: Optional[EncapsulationKeyCache] = None) -> List[Tuple[bytes, bytes]]:
+    for m in ms:
+        if len(m) != 32:
+            raise ValueError(f"Message must be exactly 32 bytes, got {len(m)}")
+    if isinstance(ek_or_eks, (bytes, bytearray, memoryview, EncapsulationKey)):
+        key = expand_encapsulation_key(ek_or_eks, params, cache)
+        hs = [key.h] * len(ms)
+        t_hat, A_hat = key.t_hat_mul, key.A_hat_mul
+    else:
+        if len(ek_or_eks) != len(ms):
+            raise ValueError(f"Got {len(ek_or_eks)} keys but {len(ms)} messages")
+        if not ms:
+            return []
+        keys = [expand_encapsulation_key(ek, params, cache) for ek in ek_or_eks]
+        hs = [key.h for key in keys]
+        t_hat = stack_mulcaches([key.t_hat_mul for key in keys])
+        A_hat = stack_mulcaches([key.A_hat_mul for key in keys])
+    with stage("kem.encaps"):
+        with stage("hash"):
+            g_outputs = [G(m + h) for m, h in zip(ms, hs)]
+        cs = k_pke_encrypt_batch(t_hat, A_hat, ms, [g[32:64] for g in g_outputs], params)
+        return [(g[:32], c) for g, c in zip(g_outputs, cs)]
+
+def _encaps(key: EncapsulationKey, m: bytes, params: MLKEMParams) -> Tuple[bytes, bytes]:
+    g_input = m + key.h
+    with stage("hash"):
+        g_output = G(g_input)
     K = g_output[:32]
     r = g_output[32:64]
-    c = k_pke_encrypt(ek, m, r, params)
+    c = k_pke_encrypt_expanded(key.t_hat_mul, key.A_hat_mul, m, r, params)
     return K, c
-
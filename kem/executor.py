@@ -0,0 +1,175 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, wait as wait_futures
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from pke.params import MLKEMParams, get_params
+from kem.keys import DecapsulationKey, EncapsulationKey
+from kem.compact import COMPACT_BYTES, COMPACT_BYTES_WITH_HASH, expand_compact_key
+from kem.keygen import ml_kem_keygen_batch
+from kem.encapsulate import ml_kem_encaps_batch
+from kem.decapsulate import ml_kem_decaps_batch
+from utils.hash_utils import H
+
+DEFAULT_CHUNKSIZE = 16
+WORKER_KEY_LIMIT = 256
+
+# Per-worker state, populated by _init_worker in each pool process. Preloaded
+# keys are pinned for the worker's lifetime, since callers only send their
+# digest; keys sent with a call go through a bounded LRU.
+_pinned_keys: Dict[bytes, object] = {}
+_worker_keys: "OrderedDict[bytes, object]" = OrderedDict()
+
+def _init_worker(preload: Tuple[Tuple[bytes, str], ...]) -> None:
+    # Importing this module already built the NTT, CBD and sampling tables;
+    # expand preloaded keys once so calls only need to send their digest
+    for key, params_name in preload:
+        _pinned_keys[H(key)] = _expand_key(key, get_params(params_name))
+
+def _expand_worker_key(digest: bytes, key: Optional[bytes], params: MLKEMParams, cache: bool = True):
+    expanded = _pinned_keys.get(digest)
+    if expanded is not None:
+        return expanded
+    expanded = _worker_keys.get(digest)
+    if expanded is not None:
+        _worker_keys.move_to_end(digest)
+        return expanded
+    if key is None:
+        raise KeyError(f"Key {digest.hex()[:16]} was not preloaded in this worker")
+    expanded = _expand_key(key, params)
+    if cache:
+        _worker_keys[digest] = expanded
+        while len(_worker_keys) > WORKER_KEY_LIMIT:
+            _worker_keys.popitem(last=False)
+    return expanded
+
+def _expand_key(key: bytes, params: MLKEMParams):
+    if len(key) == params.sk_bytes:
+        expanded = DecapsulationKey.from_bytes(key, params)
+    elif len(key) in (COMPACT_BYTES, COMPACT_BYTES_WITH_HASH):
+        # Seed-only key: regenerated here, then kept like any other key
+        expanded = expand_compact_key(key, params)
+    else:
+        expanded = EncapsulationKey.from_bytes(key, params)
+    return expanded
+
+def _keygen_chunk(params_name: str, n: int) -> List[Tuple[bytes, bytes]]:
+    return ml_kem_keygen_batch(get_params(params_name), n)
+
+def _encaps_chunk(params_name: str, digest: bytes, ek: Optional[bytes], n: int,
+                  cache: bool = True) -> List[Tuple[bytes, bytes]]:
+    params = get_params(params_name)
+    return ml_kem_encaps_batch(_expand_worker_key(digest, ek, params, cache), params, n)
+
+def _decaps_chunk(params_name: str, digest: bytes, dk: Optional[bytes], cs: List[bytes],
+                  cache: bool = True) -> List[bytes]:
+    params = get_params(params_name)
+    return ml_kem_decaps_batch(_expand_worker_key(digest, dk, params, cache), cs, params)
+
+class KEMExecutor:
+    """Runs ML-KEM keygen, encaps and decaps on a pool of worker processes.
+
+    ``max_workers`` defaults to ``os.cpu_count()``; one worker per physical
+    core is usually best. Work is shipped in chunks of up to ``chunksize``
+    operations. Keys given in ``preload`` as ``(key_bytes, params)`` are
+    expanded once per worker at startup, kept for the worker's lifetime and
+    then referenced by digest only. Other keys are kept in a per-worker LRU of
+    ``WORKER_KEY_LIMIT`` entries; pass ``cache=False`` for single-use keys so
+    they do not push out keys that will be used again. Each call returns one Future per operation; ``wait()`` blocks until all
+    in-flight work is done.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, chunksize: int = DEFAULT_CHUNKSIZE,
+                 preload: Iterable[Tuple[bytes, MLKEMParams]] = (), mp_context=None):
+        if chunksize < 1:
+            raise ValueError(f"chunksize must be at least 1, got {chunksize}")
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        preload = tuple((bytes(key), params.name) for key, params in preload)
+        self._preloaded = {H(key) for key, _ in preload}
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=mp_context,
+            initializer=_init_worker,
+            initargs=(preload,),
+        )
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def keygen(self, params: MLKEMParams, n: int = 1) -> List[Future]:
+        futures = []
+        for size in self._chunk_sizes(n):
+            futures.extend(self._submit(size, _keygen_chunk, params.name, size))
+        return futures
+
+    def encaps(self, ek: bytes, params: MLKEMParams, n: int = 1, cache: bool = True) -> List[Future]:
+        digest, payload = self._key_ref(ek)
+        futures = []
+        for size in self._chunk_sizes(n):
+            futures.extend(self._submit(size, _encaps_chunk, params.name, digest, payload, size, cache))
+        return futures
+
+    def decaps(self, dk: bytes, cs: Sequence[bytes], params: MLKEMParams, cache: bool = True) -> List[Future]:
+        digest, payload = self._key_ref(dk)
+        cs = list(cs)
+        futures = []
+        for start in range(0, len(cs), self.chunksize):
+            chunk = cs[start:start + self.chunksize]
+            futures.extend(self._submit(len(chunk), _decaps_chunk, params.name, digest, payload, chunk, cache))
+        return futures
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for all in-flight operations; returns False if the timeout expired first."""
+        with self._lock:
+            pending = set(self._in_flight)
+        _, not_done = wait_futures(pending, timeout=timeout)
+        return not not_done
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def __enter__(self) -> "KEMExecutor":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.shutdown(wait=True)
+
+    def _chunk_sizes(self, n: int) -> List[int]:
+        if n < 0:
+            raise ValueError(f"Batch size must be non-negative, got {n}")
+        return [min(self.chunksize, n - start) for start in range(0, n, self.chunksize)]
+
+    def _key_ref(self, key: bytes) -> Tuple[bytes, Optional[bytes]]:
+        digest = H(key)
+        return digest, None if digest in self._preloaded else bytes(key)
+
+    def _submit(self, size: int, fn, *args) -> List[Future]:
+        items = [Future() for _ in range(size)]
+        with self._lock:
+            self._in_flight.update(items)
+        try:
+            chunk = self._pool.submit(fn, *args)
+        except Exception:
+            with self._lock:
+                self._in_flight.difference_update(items)
+            raise
+        chunk.add_done_callback(lambda done: self._resolve(done, items))
+        return items
+
+    def _resolve(self, chunk: Future, items: List[Future]) -> None:
+        if chunk.cancelled():
+            for item in items:
+                item.cancel()
+        else:
+            error = chunk.exception()
+            results = [None] * len(items) if error is not None else chunk.result()
+            for item, result in zip(items, results):
+                # Skip items the caller already cancelled
+                if not item.set_running_or_notify_cancel():
+                    continue
+                if error is not None:
+                    item.set_exception(error)
+                else:
+                    item.set_result(result)
+        with self._lock:
+            self._in_flight.difference_update(items)
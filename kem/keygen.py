@@ -1,15 +1,48 @@
-from typing import Tuple
+from typing import List, Tuple
 from pke.params import MLKEMParams
-from pke.keygen import k_pke_keygen
+from pke.keygen import k_pke_keygen_batch, k_pke_keygen_expanded_batch
+from kem.keys import DecapsulationKey
 from utils.hash_utils import H
 from utils.random_utils import random_bytes
+from utils.instrumentation import stage
 
 def ml_kem_keygen(params: MLKEMParams) -> Tuple[bytes, bytes]:    
-    d = random_bytes(32)
-    ek_pke, dk_pke = k_pke_keygen(d, params)
-    z = random_bytes(32)
-    ek_pke_hash = H(ek_pke)
+    return ml_kem_keygen_internal(random_bytes(32), random_bytes(32), params)
+
+def ml_kem_keygen_internal(d: bytes, z: bytes, params: MLKEMParams) -> Tuple[bytes, bytes]:
+    """Deterministic key generation: the same (d, z) always gives the same (ek, dk)."""
+    return ml_kem_keygen_internal_batch([d], [z], params)[0]
+
+def ml_kem_keygen_internal_expanded(d: bytes, z: bytes, params: MLKEMParams) -> DecapsulationKey:
+    """ml_kem_keygen_internal as an expanded key, built without parsing the dk or sampling A_hat again."""
+    if len(z) != 32:
+        raise ValueError(f"Seed z must be exactly 32 bytes, got {len(z)}")
+    with stage("kem.keygen"):
+        (ek_pke, dk_pke, t_hat, A_hat, s_hat), = k_pke_keygen_expanded_batch([d], params)
+        _, dk = _assemble_keypair(ek_pke, dk_pke, z)
+        return DecapsulationKey.from_parts(dk, params, t_hat, A_hat, s_hat)
+
+def ml_kem_keygen_batch(params: MLKEMParams, n: int) -> List[Tuple[bytes, bytes]]:
+    if n < 0:
+        raise ValueError(f"Batch size must be non-negative, got {n}")
+    ds = [random_bytes(32) for _ in range(n)]
+    zs = [random_bytes(32) for _ in range(n)]
+    return ml_kem_keygen_internal_batch(ds, zs, params)
+
+def ml_kem_keygen_internal_batch(ds: List[bytes], zs: List[bytes], params: MLKEMParams) -> List[Tuple[bytes, bytes]]:
+    if len(ds) != len(zs):
+        raise ValueError(f"Got {len(ds)} d seeds but {len(zs)} z seeds")
+    for z in zs:
+        if len(z) != 32:
+            raise ValueError(f"Seed z must be exactly 32 bytes, got {len(z)}")
+    with stage("kem.keygen"):
+        pke_keys = k_pke_keygen_batch(ds, params)
+        return [_assemble_keypair(ek_pke, dk_pke, z) for (ek_pke, dk_pke), z in zip(pke_keys, zs)]
+
+def _assemble_keypair(ek_pke: bytes, dk_pke: bytes, z: bytes) -> Tuple[bytes, bytes]:
+    with stage("hash"):
+        ek_pke_hash = H(ek_pke)
     
     ek = ek_pke
     dk = dk_pke + ek_pke + ek_pke_hash + z
-    return ek, dk
\ No newline at end of file
+    return ek, dk
@@ -0,0 +1,232 @@
+import mmap
+import os
+import struct
+import threading
+from typing import Iterator, Optional
+from pke.params import MLKEMParams, get_params
+from kem.cache import ExpansionCache
+from kem.keys import DecapsulationKey, parse_decapsulation_key
+from utils.hash_utils import H
+
+# Records file: header | dk | dk | ... with one fixed-size dk per record
+RECORDS_MAGIC = b"MLKEMKR1"
+RECORDS_HEADER = struct.Struct("!8s16s")
+# Index file (<path>.idx): header | capacity little-endian uint64 slots (record number + 1, 0 = empty)
+INDEX_MAGIC = b"MLKEMIX1"
+INDEX_HEADER = struct.Struct("<8sQQ")
+INDEX_SLOT = struct.Struct("<Q")
+SLOT_BYTES = INDEX_SLOT.size
+HASH_BYTES = 32
+INITIAL_CAPACITY = 1024
+MAX_LOAD = 2 / 3
+
+class DecapsulationKeyring:
+    """Append-only file of decapsulation keys, looked up by H(ek).
+
+    Records are the raw dk bytes, so every record has the size of a dk of the
+    keyring's parameter set and already holds its H(ek). A separate
+    open-addressing hash table in ``<path>.idx`` maps H(ek) to record
+    numbers. Both files are memory-mapped and nothing is read up front, so
+    opening costs the same for ten keys or a million. A lookup probes the
+    index and compares against the H(ek) inside the record; ``get`` returns
+    a memoryview into the mapping without copying.
+
+    An index that is missing or behind the records file (for example after a
+    crash between the two writes) is completed when the keyring is opened.
+    """
+
+    def __init__(self, path: str, params: Optional[MLKEMParams] = None):
+        self.path = path
+        self.index_path = path + ".idx"
+        self._lock = threading.RLock()
+        if not os.path.exists(path):
+            if params is None:
+                raise FileNotFoundError(f"Keyring {path} does not exist and no parameter set was given")
+            with open(path, "xb") as f:
+                f.write(RECORDS_HEADER.pack(RECORDS_MAGIC, params.name.encode()))
+        self._file = open(path, "r+b")
+        magic, name = RECORDS_HEADER.unpack(self._file.read(RECORDS_HEADER.size))
+        if magic != RECORDS_MAGIC:
+            self._file.close()
+            raise ValueError(f"{path} is not a keyring file")
+        self.params = get_params(name.rstrip(b"\0").decode())
+        if params is not None and params != self.params:
+            self._file.close()
+            raise ValueError(f"Keyring {path} holds {self.params.name} keys, not {params.name}")
+        self.record_bytes = self.params.sk_bytes
+        # H(ek) sits after dk_pke and ek in every record
+        self._hash_offset = self.record_bytes - 2 * HASH_BYTES
+        self._records = self._map_records()
+        self._open_index()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, h: bytes) -> bool:
+        return self.get(h) is not None
+
+    def __getitem__(self, h: bytes) -> memoryview:
+        dk = self.get(h)
+        if dk is None:
+            raise KeyError(bytes(h).hex())
+        return dk
+
+    def __iter__(self) -> Iterator[memoryview]:
+        for i in range(len(self)):
+            yield self.record(i)
+
+    def get(self, h: bytes) -> Optional[memoryview]:
+        """The dk whose H(ek) is ``h``, as a read-only view into the file, or None."""
+        with self._lock:
+            return self._find(h)[1]
+
+    def get_by_ek(self, ek: bytes) -> Optional[memoryview]:
+        return self.get(H(ek))
+
+    def record(self, i: int) -> memoryview:
+        if not 0 <= i < self._count:
+            raise IndexError(f"Record {i} out of range for {self._count} records")
+        with self._lock:
+            return self._record(i)
+
+    def decapsulation_key(self, h: bytes, cache: Optional[ExpansionCache] = None) -> DecapsulationKey:
+        """Expanded key for ``h``; a DecapsulationKeyCache bounds repeat expansions."""
+        dk = self[h]
+        if cache is not None:
+            return cache.get(dk, self.params)
+        return DecapsulationKey.from_bytes(dk, self.params)
+
+    def append(self, dk: bytes) -> int:
+        """Add a dk and return its record number; its stored H(ek) must be correct and new."""
+        if len(dk) != self.record_bytes:
+            raise ValueError(f"Decapsulation key must be {self.record_bytes} bytes, got {len(dk)}")
+        _, ek_pke, h, _ = parse_decapsulation_key(bytes(dk), self.params)
+        if H(ek_pke) != h:
+            raise ValueError("Decapsulation key holds the wrong H(ek)")
+        with self._lock:
+            if self._find(h)[1] is not None:
+                raise ValueError(f"Key {h.hex()[:16]} is already in the keyring")
+            self._file.seek(RECORDS_HEADER.size + self._count * self.record_bytes)
+            self._file.write(dk)
+            self._file.flush()
+            index = self._count
+            self._insert(h, index)
+            return index
+
+    def flush(self) -> None:
+        """Force appended records and the index to disk."""
+        with self._lock:
+            os.fsync(self._file.fileno())
+            self._index.flush()
+
+    def close(self) -> None:
+        # The records mapping is closed once the last view handed out is released
+        with self._lock:
+            self._index.close()
+            self._file.close()
+            self._records = None
+
+    def __enter__(self) -> "DecapsulationKeyring":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def _map_records(self) -> mmap.mmap:
+        return mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _remap_records(self) -> mmap.mmap:
+        # The mapping was made before later appends; views handed out keep the old one alive
+        self._records = self._map_records()
+        return self._records
+
+    def _stored_records(self) -> int:
+        size = os.fstat(self._file.fileno()).st_size - RECORDS_HEADER.size
+        return size // self.record_bytes
+
+    def _open_index(self) -> None:
+        stored = self._stored_records()
+        if not os.path.exists(self.index_path):
+            self._write_index(_capacity_for(stored), 0)
+        self._map_index()
+        if self._count > stored:
+            # Index points past the records (truncated file): rebuild it
+            self._index.close()
+            self._write_index(_capacity_for(stored), 0)
+            self._map_index()
+        # Index any records appended after the index was last written
+        for i in range(self._count, stored):
+            self._insert(self._stored_hash(self._record(i)), i)
+
+    def _map_index(self) -> None:
+        with open(self.index_path, "r+b") as f:
+            self._index = mmap.mmap(f.fileno(), 0)
+        magic, capacity, count = INDEX_HEADER.unpack_from(self._index)
+        if magic != INDEX_MAGIC or len(self._index) != INDEX_HEADER.size + capacity * SLOT_BYTES:
+            raise ValueError(f"{self.index_path} is not a keyring index")
+        self._capacity = capacity
+        self._count = count
+
+    def _write_index(self, capacity: int, count: int) -> None:
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, capacity, count))
+            f.truncate(INDEX_HEADER.size + capacity * SLOT_BYTES)
+        os.replace(tmp_path, self.index_path)
+
+    def _stored_hash(self, record: memoryview) -> bytes:
+        return bytes(record[self._hash_offset:self._hash_offset + HASH_BYTES])
+
+    def _record(self, i: int) -> memoryview:
+        start = RECORDS_HEADER.size + i * self.record_bytes
+        records = self._records
+        if start + self.record_bytes > len(records):
+            records = self._remap_records()
+        return memoryview(records)[start:start + self.record_bytes]
+
+    def _slot(self, slot: int) -> int:
+        return INDEX_SLOT.unpack_from(self._index, INDEX_HEADER.size + slot * SLOT_BYTES)[0]
+
+    def _set_slot(self, slot: int, entry: int) -> None:
+        INDEX_SLOT.pack_into(self._index, INDEX_HEADER.size + slot * SLOT_BYTES, entry)
+
+    def _find(self, h: bytes):
+        """(slot, record view) for ``h``, or (first free slot, None) if it is absent."""
+        if len(h) != HASH_BYTES:
+            raise ValueError(f"H(ek) must be {HASH_BYTES} bytes, got {len(h)}")
+        mask = self._capacity - 1
+        slot = int.from_bytes(h[:8], "little") & mask
+        while True:
+            entry = self._slot(slot)
+            if entry == 0:
+                return slot, None
+            record = self._record(entry - 1)
+            if record[self._hash_offset:self._hash_offset + HASH_BYTES] == h:
+                return slot, record
+            slot = (slot + 1) & mask
+
+    def _insert(self, h: bytes, index: int) -> None:
+        if self._count + 1 > self._capacity * MAX_LOAD:
+            self._grow()
+        slot, _ = self._find(h)
+        self._set_slot(slot, index + 1)
+        self._count += 1
+        INDEX_HEADER.pack_into(self._index, 0, INDEX_MAGIC, self._capacity, self._count)
+
+    def _grow(self) -> None:
+        count = self._count
+        self._index.close()
+        self._write_index(self._capacity * 2, 0)
+        self._map_index()
+        for i in range(count):
+            record = self._record(i)
+            slot, _ = self._find(self._stored_hash(record))
+            self._set_slot(slot, i + 1)
+        self._count = count
+        INDEX_HEADER.pack_into(self._index, 0, INDEX_MAGIC, self._capacity, self._count)
+
+def _capacity_for(n: int) -> int:
+    capacity = INITIAL_CAPACITY
+    while n + 1 > capacity * MAX_LOAD:
+        capacity *= 2
+    return capacity
@@ -0,0 +1,102 @@
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+from pke.params import MLKEMParams
+from pke.encrypt import expand_public_key
+from pke.decrypt import expand_secret_key
+from utils.hash_utils import H
+from utils.poly_utils import MulCache, mulcache
+
+@dataclass(frozen=True)
+class EncapsulationKey:
+    """Encapsulation key with H(ek), t_hat and A_hat expanded once.
+
+    ``t_hat_mul`` and ``A_hat_mul`` are the mulcache forms of t_hat and A_hat
+    that every encapsulation multiplies by.
+    """
+    ek: bytes
+    params: MLKEMParams
+    h: bytes
+    t_hat: np.ndarray
+    A_hat: np.ndarray
+    t_hat_mul: Optional[MulCache] = field(default=None, repr=False, compare=False)
+    A_hat_mul: Optional[MulCache] = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.t_hat_mul is None:
+            object.__setattr__(self, 't_hat_mul', mulcache(self.t_hat))
+        if self.A_hat_mul is None:
+            object.__setattr__(self, 'A_hat_mul', mulcache(self.A_hat))
+
+    @classmethod
+    def from_bytes(cls, ek: bytes, params: MLKEMParams) -> "EncapsulationKey":
+        ek = bytes(ek)
+        if len(ek) != params.pk_bytes:
+            raise ValueError(f"Encapsulation key must be {params.pk_bytes} bytes, got {len(ek)}")
+        t_hat, A_hat = _frozen(*expand_public_key(ek, params))
+        return cls(ek=ek, params=params, h=H(ek), t_hat=t_hat, A_hat=A_hat)
+
+@dataclass(frozen=True)
+class DecapsulationKey:
+    """Decapsulation key with s_hat and the embedded encapsulation key expanded once."""
+    dk: bytes
+    params: MLKEMParams
+    s_hat: np.ndarray
+    ek: EncapsulationKey
+    h: bytes
+    z: bytes
+    s_hat_mul: Optional[MulCache] = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.s_hat_mul is None:
+            object.__setattr__(self, 's_hat_mul', mulcache(self.s_hat))
+
+    @classmethod
+    def from_bytes(cls, dk: bytes, params: MLKEMParams) -> "DecapsulationKey":
+        # Copy once so memoryview input (e.g. from a keyring) is not kept alive
+        dk = bytes(dk)
+        dk_pke, ek_pke, h_ek_pke, z = parse_decapsulation_key(dk, params)
+        t_hat, A_hat = _frozen(*expand_public_key(ek_pke, params))
+        # Keep the H(ek) stored in dk, as decapsulation of raw bytes does
+        ek = EncapsulationKey(ek=ek_pke, params=params, h=h_ek_pke, t_hat=t_hat, A_hat=A_hat)
+        s_hat, = _frozen(expand_secret_key(dk_pke, params))
+        return cls(dk=dk, params=params, s_hat=s_hat, ek=ek, h=h_ek_pke, z=z)
+
+    @classmethod
+    def from_parts(cls, dk: bytes, params: MLKEMParams, t_hat: np.ndarray, A_hat: np.ndarray,
+                   s_hat: np.ndarray) -> "DecapsulationKey":
+        """Expanded key from the arrays key generation already computed for ``dk``."""
+        dk = bytes(dk)
+        _, ek_pke, h_ek_pke, z = parse_decapsulation_key(dk, params)
+        t_hat, A_hat, s_hat = _frozen(t_hat, A_hat, s_hat)
+        ek = EncapsulationKey(ek=ek_pke, params=params, h=h_ek_pke, t_hat=t_hat, A_hat=A_hat)
+        return cls(dk=dk, params=params, s_hat=s_hat, ek=ek, h=h_ek_pke, z=z)
+
+def _frozen(*arrays: np.ndarray) -> Tuple[np.ndarray, ...]:
+    # Expanded keys are shared between callers and threads, so lock them
+    for array in arrays:
+        array.setflags(write=False)
+    return arrays
+
+def parse_decapsulation_key(dk: bytes, params: MLKEMParams) -> Tuple[bytes, bytes, bytes, bytes]:
+    
+    expected_length = params.sk_bytes
+    if len(dk) != expected_length:
+        raise ValueError(f"Decapsulation key must be {expected_length} bytes, got {len(dk)}")
+    
+    offset = 0
+    
+    dk_pke_len = 384 * params.k
+    dk_pke = dk[offset:offset + dk_pke_len]
+    offset += dk_pke_len
+    
+    ek_pke_len = params.pk_bytes
+    ek_pke = dk[offset:offset + ek_pke_len]
+    offset += ek_pke_len
+    
+    ek_pke_hash = dk[offset:offset + 32]
+    offset += 32
+    
+    z = dk[offset:offset + 32]
+    
+    return dk_pke, ek_pke, ek_pke_hash, z
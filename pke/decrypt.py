@@ -1,103 +1,93 @@
 import numpy as np
-from typing import List
+from typing import List, Tuple
 from pke.params import MLKEMParams, N, Q
-from utils.poly_utils import ntt, intt, dot_product_ntt
-from utils.serialization import byte_decode_12, byte_decode_du, byte_decode_dv
+from utils.poly_utils import ntt_array, intt_array, dot_product_ntt_array
+from utils.serialization import byte_decode_array, decompress_array, decode_decompress_array, encode_messages
+from utils.instrumentation import stage
 
 def k_pke_decrypt(dk_pke: bytes, c: bytes, params: MLKEMParams) -> bytes:
 
     if len(dk_pke) != 384 * params.k:
         raise ValueError(f"Secret key must be {384 * params.k} bytes, got {len(dk_pke)}")
-    if len(c) != params.ct_bytes:
-        raise ValueError(f"Ciphertext must be {params.ct_bytes} bytes, got {len(c)}")
-    
     
+    s_hat = expand_secret_key(dk_pke, params)
+    return k_pke_decrypt_expanded(s_hat, c, params)
+
+def expand_secret_key(dk_pke: bytes, params: MLKEMParams) -> np.ndarray:
     s = parse_secret_key(dk_pke, params.k)
-    
-    u_compressed, v_compressed = parse_ciphertext(c, params)
-    
-    u = [decompress(poly, params.du) for poly in u_compressed]
-    v = decompress(v_compressed, params.dv)
-    
-    s_hat = [ntt(poly) for poly in s]
-    u_hat = [ntt(poly) for poly in u]
-    
-    su_ntt = dot_product_ntt(s_hat, u_hat)
-    
-    su = intt(su_ntt)
-    
-    w = [(v[i] - su[i]) % Q for i in range(N)]
-    
-    m = compress_to_message(w)
-    
-    return m
+    return ntt_array(s)
 
-def parse_secret_key(dk_pke: bytes, k: int) -> list:
+def k_pke_decrypt_expanded(s_hat: np.ndarray, c: bytes, params: MLKEMParams) -> bytes:
+    return k_pke_decrypt_batch(s_hat, [c], params)[0]
 
-    s = []
-    offset = 0
-    
-    for i in range(k):
-        poly_bytes = dk_pke[offset:offset + 384]
-        poly = byte_decode_12(poly_bytes)
-        s.append(poly)
-        offset += 384
+def k_pke_decrypt_batch(s_hat: np.ndarray, cs: List[bytes], params: MLKEMParams) -> List[bytes]:
+
+    for c in cs:
+        if len(c) != params.ct_bytes:
+            raise ValueError(f"Ciphertext must be {params.ct_bytes} bytes, got {len(c)}")
+    if not cs:
+        return []
+    
+    with stage("pke.decrypt"):
+        with stage("decode"):
+            u, v = decode_ciphertexts(cs, params)
+        
+        with stage("ntt"):
+            u_hat = ntt_array(u)
+        
+        with stage("matrix_vector"):
+            su_ntt = dot_product_ntt_array(s_hat, u_hat)
+        
+        with stage("ntt_inverse"):
+            su = intt_array(su_ntt)
+        
+        w = (v - su) % Q
+        
+        with stage("encode"):
+            return encode_messages(w)
+
+def parse_secret_key(dk_pke: bytes, k: int) -> np.ndarray:
+
+    return byte_decode_array(dk_pke[:384 * k], 12)
+
+def decode_ciphertexts(cs: List[bytes], params: MLKEMParams) -> Tuple[np.ndarray, np.ndarray]:
+
+    # Unpack and decompress u (batch, k, 256) and v (batch, 256) in one pass
+    u_bytes = 32 * params.du * params.k
+    c = np.frombuffer(b"".join(cs), dtype=np.uint8).reshape(len(cs), params.ct_bytes)
+    u = decode_decompress_array(c[:, :u_bytes].reshape(len(cs), params.k, 32 * params.du), params.du)
+    v = decode_decompress_array(c[:, u_bytes:], params.dv)
     
-    return s
+    return u, v
+
+# List-based helpers from before vectorization. Nothing in the package calls
+# them any more; they are kept for API compatibility.
 
 def parse_ciphertext(c: bytes, params: MLKEMParams) -> tuple:
 
-    offset = 0
-    
-    u_compressed = []
-    u_poly_bytes = 32 * params.du  
-    
-    for i in range(params.k):
-        poly_bytes = c[offset:offset + u_poly_bytes]
-        poly = byte_decode_du(poly_bytes, params.du)
-        u_compressed.append(poly)
-        offset += u_poly_bytes
+    u_compressed, v_compressed = parse_ciphertexts([c], params)
     
-    v_poly_bytes = 32 * params.dv
-    v_bytes = c[offset:offset + v_poly_bytes]
-    v_compressed = byte_decode_dv(v_bytes, params.dv)
+    return u_compressed[0].tolist(), v_compressed[0].tolist()
+
+def parse_ciphertexts(cs: List[bytes], params: MLKEMParams) -> Tuple[np.ndarray, np.ndarray]:
+
+    u_bytes = 32 * params.du * params.k
+    v_bytes = 32 * params.dv
+    u_compressed = byte_decode_array(b"".join(c[:u_bytes] for c in cs), params.du)
+    v_compressed = byte_decode_array(b"".join(c[u_bytes:u_bytes + v_bytes] for c in cs), params.dv)
     
-    return u_compressed, v_compressed
+    return u_compressed.reshape(len(cs), params.k, N), v_compressed
 
 def decompress(poly_compressed: list, d: int) -> list:
 
     if d == 0:
         return [0] * len(poly_compressed)
     
-    decompressed = []
-    
-    for coeff in poly_compressed:
-        decompressed_coeff = round(Q * coeff / (1 << d)) % Q
-        decompressed.append(decompressed_coeff)
-    
-    return decompressed
+    return decompress_array(poly_compressed, d).tolist()
 
 def compress_to_message(w: list) -> bytes:
 
-    q_half = Q // 2
-    q_quarter = Q // 4
-    
-    bits = []
-    for coeff in w:
-        coeff = coeff % Q
-        
-        if coeff > q_quarter and coeff < 3 * q_quarter:
-            bits.append(1)
-        else:
-            bits.append(0)
-    
-    message = b""
-    for i in range(32):
-        byte_val = 0
-        for j in range(8):
-            bit_idx = i * 8 + j
-            if bit_idx < len(bits) and bits[bit_idx]:
-                byte_val |= (1 << j)
-        message += bytes([byte_val])
+    if len(w) != N:
+        raise ValueError(f"w must have length {N}")
     
-    return message
+    return encode_messages(np.asarray(w, dtype=np.int64) % Q)[0]
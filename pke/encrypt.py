@@ -1,94 +1,97 @@
 import numpy as np
 from typing import List, Tuple
-from pke.params import MLKEMParams, N, Q
-from utils.poly_utils import sample_poly_cbd, ntt, intt, matrix_vector_multiply_ntt, dot_product_ntt
-from utils.serialization import byte_decode_12, byte_encode_du, byte_encode_dv, bits_to_bytes
+from pke.params import MLKEMParams, Q
+from utils.poly_utils import ntt_array, intt_array, matrix_transpose_vector_mul_ntt_array, dot_product_ntt_array
+from utils.serialization import byte_decode_array, byte_encode_array, compress_array, compress_encode_array, decode_messages
+from utils.instrumentation import stage
 from pke.keygen import sample_matrix_A as keygen_sample_matrix_A
-from pke.keygen import sample_error_vector
-from utils.poly_utils import multiply_ntts, add_poly
+from pke.keygen import sample_matrix_A_array, sample_error_vector
+from utils.poly_utils import matrix_vector_mul_ntt
 
 def k_pke_encrypt(ek_pke: bytes, m: bytes, r: bytes, params: MLKEMParams) -> bytes:
-    if len(m) != 32:
-        raise ValueError(f"Message m must be exactly 32 bytes, got {len(m)}")
-    if len(r) != 32:
-        raise ValueError(f"Randomness r must be exactly 32 bytes, got {len(r)}")
     if len(ek_pke) != params.pk_bytes:
         raise ValueError(f"Public key must be {params.pk_bytes} bytes, got {len(ek_pke)}")
-    
-    t_hat, rho = parse_public_key(ek_pke, params.k)
-    A_hat = sample_matrix_A(rho, params.k)
-    r1 = sample_error_vector_encrypt(r, params.k, params.eta2, 0)
-    r2 = sample_error_vector_encrypt(r, 1, params.eta2, params.k)[0]
-    r1_hat = [ntt(poly) for poly in r1]
-    u_hat = matrix_transpose_vector_multiply_ntt(A_hat, r1_hat)
-    e1 = sample_error_vector_encrypt(r, params.k, params.eta2, params.k)
-    e1_hat = [ntt(poly) for poly in e1]
-    for i in range(params.k):
-        u_hat[i] = [(u_hat[i][j] + e1_hat[i][j]) % Q for j in range(N)]
-    u = [intt(poly) for poly in u_hat]
-    v_ntt = dot_product_ntt(t_hat, r1_hat)
-    v = intt(v_ntt)
-    v = [(v[i] + r2[i]) % Q for i in range(N)]
-    m_poly = decompress_message(m)
-    v = [(v[i] + m_poly[i]) % Q for i in range(N)]
-    u_compressed = [compress(poly, params.du) for poly in u]
-    v_compressed = compress(v, params.dv)
-    c = serialize_ciphertext(u_compressed, v_compressed, params)
-    return c
+    t_hat, A_hat = expand_public_key(ek_pke, params)
+    return k_pke_encrypt_expanded(t_hat, A_hat, m, r, params)
+
+def expand_public_key(ek_pke: bytes, params: MLKEMParams) -> Tuple[np.ndarray, np.ndarray]:
+    with stage("pke.expand_public_key"):
+        with stage("decode"):
+            t_hat, rho = parse_public_key(ek_pke, params.k)
+        with stage("sample_matrix"):
+            A_hat = sample_matrix_A_array(rho, params.k)
+        return t_hat, A_hat
+
+def k_pke_encrypt_expanded(t_hat: np.ndarray, A_hat: np.ndarray, m: bytes, r: bytes, params: MLKEMParams) -> bytes:
+    return k_pke_encrypt_batch(t_hat, A_hat, [m], [r], params)[0]
+
+def k_pke_encrypt_batch(t_hat: np.ndarray, A_hat: np.ndarray, ms: List[bytes], rs: List[bytes],
+                        params: MLKEMParams) -> List[bytes]:
+    # t_hat (..., k, 256) and A_hat (..., k, k, 256) are either one key shared
+    # by the whole batch or stacked per item
+    if len(ms) != len(rs):
+        raise ValueError(f"Got {len(ms)} messages but {len(rs)} randomness values")
+    for m, r in zip(ms, rs):
+        if len(m) != 32:
+            raise ValueError(f"Message m must be exactly 32 bytes, got {len(m)}")
+        if len(r) != 32:
+            raise ValueError(f"Randomness r must be exactly 32 bytes, got {len(r)}")
+    if not ms:
+        return []
+    k = params.k
+    with stage("pke.encrypt"):
+        with stage("sample_cbd"):
+            # Nonces 0..k-1 give r1 and k..2k-1 give e1; r2 reuses nonce k
+            noise = np.stack([sample_error_vector_encrypt(r, 2 * k, params.eta2, 0) for r in rs])
+        with stage("ntt"):
+            noise_hat = ntt_array(noise)
+        r1_hat = noise_hat[:, :k]
+        e1_hat = noise_hat[:, k:]
+        r2 = noise[:, k]
+        with stage("matrix_vector"):
+            u_hat = (matrix_transpose_vector_mul_ntt_array(A_hat, r1_hat) + e1_hat) % Q
+            v_hat = dot_product_ntt_array(t_hat, r1_hat)
+        with stage("ntt_inverse"):
+            u = intt_array(u_hat)
+            v = intt_array(v_hat)
+        v = (v + r2 + decode_messages(ms)) % Q
+        with stage("encode"):
+            return serialize_ciphertexts(u, v, params)
 
 def parse_public_key(ek_pke: bytes, k: int) -> tuple:
-    t_hat = []
-    offset = 0
-    for i in range(k):
-        poly_bytes = ek_pke[offset:offset + 384]
-        poly = byte_decode_12(poly_bytes)
-        t_hat.append(poly)
-        offset += 384
-    rho = ek_pke[offset:offset + 32]
+    t_hat = byte_decode_array(ek_pke[:384 * k], 12)
+    rho = ek_pke[384 * k:384 * k + 32]
     return t_hat, rho
 
+def sample_error_vector_encrypt(r: bytes, k: int, eta: int, offset: int) -> np.ndarray:
+    return sample_error_vector(r, k, eta, offset)
+
+def serialize_ciphertexts(u: np.ndarray, v: np.ndarray, params: MLKEMParams) -> List[bytes]:
+    # u (batch, k, 256) and v (batch, 256) are compressed and packed straight
+    # into one (batch, ct_bytes) buffer
+    batch = v.shape[0]
+    c = np.concatenate([compress_encode_array(u, params.du).reshape(batch, -1),
+                        compress_encode_array(v, params.dv)], axis=-1)
+    return [row.tobytes() for row in c]
+
+# List-based helpers from before vectorization. Nothing in the package calls
+# them any more; they are kept for API compatibility.
+
 def sample_matrix_A(rho: bytes, k: int) -> list:
     return keygen_sample_matrix_A(rho, k)
 
-def sample_error_vector_encrypt(r: bytes, k: int, eta: int, offset: int) -> list:
-    return sample_error_vector(r, k, eta, offset)
-
 def matrix_transpose_vector_multiply_ntt(A_hat: list, r1_hat: list) -> list:
-    k = len(r1_hat)
-    result = []
-    for j in range(k):
-        poly_result = [0] * N
-        for i in range(k):
-            product = multiply_ntts(A_hat[i][j], r1_hat[i])
-            poly_result = add_poly(poly_result, product, Q)
-        result.append(poly_result)
-    return result
+    return matrix_vector_mul_ntt(A_hat, r1_hat, transpose=True)
 
 def decompress_message(m: bytes) -> list:
-    m_bits = []
-    for byte in m:
-        for i in range(8):
-            m_bits.append((byte >> i) & 1)
-    q_half = Q // 2
-    poly = []
-    for i in range(N):
-        poly.append(m_bits[i] * q_half)
-    return poly
+    if len(m) != 32:
+        raise ValueError(f"Message m must be exactly 32 bytes, got {len(m)}")
+    return decode_messages([m])[0].tolist()
 
 def compress(poly: list, d: int) -> list:
     if d == 0:
         return [0] * len(poly)
-    compressed = []
-    divisor = Q // (1 << d)
-    for coeff in poly:
-        compressed_coeff = round((1 << d) * coeff / Q) % (1 << d)
-        compressed.append(compressed_coeff)
-    return compressed
+    return compress_array(poly, d).tolist()
 
 def serialize_ciphertext(u_compressed: list, v_compressed: list, params: MLKEMParams) -> bytes:
-    c_bytes = b""
-    for poly in u_compressed:
-        c_bytes += byte_encode_du(poly, params.du)
-    c_bytes += byte_encode_dv(v_compressed, params.dv)
-    return c_bytes
-
+    return byte_encode_array(u_compressed, params.du) + byte_encode_array(v_compressed, params.dv)
@@ -1,65 +1,66 @@
 import numpy as np
-from pke.params import MLKEMParams, N, Q
+from pke.params import MLKEMParams, Q
 from utils.hash_utils import G
-from utils.poly_utils import sample_uniform_poly, sample_poly_cbd, ntt, matrix_vector_multiply_ntt
-from utils.serialization import byte_encode_12
+from utils.instrumentation import stage
+from utils.poly_utils import sample_ntt_matrix, sample_cbd_vector, ntt_array, matrix_vector_mul_ntt_array
+from utils.serialization import byte_encode_array
 from typing import Tuple, List
 
 def k_pke_keygen(d: bytes, params: MLKEMParams) -> Tuple[bytes, bytes]:
+    return k_pke_keygen_batch([d], params)[0]
 
-    if len(d) != 32:
-        raise ValueError(f"Seed d must be exactly 32 bytes, got {len(d)}")
-    
-    expanded = G(d)
-    rho = expanded[:32]
-    sigma = expanded[32:64]
-    A_hat = sample_matrix_A(rho, params.k)
-    s = sample_secret_vector(sigma, params.k, params.eta1, 0)
-    e = sample_error_vector(sigma, params.k, params.eta1, params.k)
-    s_hat = [ntt(poly) for poly in s]
-    e_hat = [ntt(poly) for poly in e]
-    t_hat = matrix_vector_multiply_ntt(A_hat, s_hat)
+def k_pke_keygen_batch(ds: List[bytes], params: MLKEMParams) -> List[Tuple[bytes, bytes]]:
+    return [(ek_pke, dk_pke) for ek_pke, dk_pke, _, _, _ in k_pke_keygen_expanded_batch(ds, params)]
+
+def k_pke_keygen_expanded_batch(ds: List[bytes], params: MLKEMParams
+                                ) -> List[Tuple[bytes, bytes, np.ndarray, np.ndarray, np.ndarray]]:
+    """(ek_pke, dk_pke, t_hat, A_hat, s_hat) per seed, so callers can skip re-expanding the keys."""
 
-    for i in range(params.k):
-        t_hat[i] = [(t_hat[i][j] + e_hat[i][j]) % Q for j in range(N)]
+    for d in ds:
+        if len(d) != 32:
+            raise ValueError(f"Seed d must be exactly 32 bytes, got {len(d)}")
+    if not ds:
+        return []
     
-    pk = serialize_public_key(t_hat, rho, params.k)
-    sk = serialize_secret_key(s, params.k)
-    return pk, sk
+    with stage("pke.keygen"):
+        with stage("hash"):
+            expanded = [G(d) for d in ds]
+        rhos = [e[:32] for e in expanded]
+        sigmas = [e[32:64] for e in expanded]
+        with stage("sample_matrix"):
+            A_hat = np.stack([sample_matrix_A_array(rho, params.k) for rho in rhos])
+        with stage("sample_cbd"):
+            # Nonces 0..k-1 give s and k..2k-1 give e
+            noise = np.stack([sample_cbd_vector(sigma, 2 * params.k, params.eta1, 0) for sigma in sigmas])
+        with stage("ntt"):
+            noise_hat = ntt_array(noise)
+        s = noise[:, :params.k]
+        s_hat = noise_hat[:, :params.k]
+        e_hat = noise_hat[:, params.k:]
+        with stage("matrix_vector"):
+            t_hat = (matrix_vector_mul_ntt_array(A_hat, s_hat) + e_hat) % Q
+
+        with stage("encode"):
+            return [
+                (serialize_public_key(t_hat[b], rhos[b], params.k), serialize_secret_key(s[b], params.k),
+                 t_hat[b], A_hat[b], s_hat[b])
+                for b in range(len(ds))
+            ]
+
+def sample_matrix_A_array(rho: bytes, k: int) -> np.ndarray:
+    return sample_ntt_matrix(rho, k)
 
 def sample_matrix_A(rho: bytes, k: int) -> list:
-    A = []
-    for i in range(k):
-        row = []
-        for j in range(k):
-            poly = sample_uniform_poly(rho, i, j)
-            row.append(poly)
-        A.append(row)
-    return A
+    return sample_matrix_A_array(rho, k).tolist()
 
-def sample_secret_vector(sigma: bytes, k: int, eta: int, offset: int) -> list:
-    s = []
-    for i in range(k):
-        poly = sample_poly_cbd(sigma, offset + i, eta)
-        s.append(poly)
-    return s
+def sample_secret_vector(sigma: bytes, k: int, eta: int, offset: int) -> np.ndarray:
+    return sample_cbd_vector(sigma, k, eta, offset)
 
-def sample_error_vector(sigma: bytes, k: int, eta: int, offset: int) -> list:
-    e = []
-    for i in range(k):
-        poly = sample_poly_cbd(sigma, offset + i, eta)
-        e.append(poly)
-    return e
+def sample_error_vector(sigma: bytes, k: int, eta: int, offset: int) -> np.ndarray:
+    return sample_cbd_vector(sigma, k, eta, offset)
 
-def serialize_public_key(t_hat: list, rho: bytes, k: int) -> bytes:
-    pk_bytes = b""
-    for poly in t_hat:
-        pk_bytes += byte_encode_12(poly)
-    pk_bytes += rho
-    return pk_bytes
+def serialize_public_key(t_hat, rho: bytes, k: int) -> bytes:
+    return byte_encode_array(t_hat, 12) + rho
 
-def serialize_secret_key(s: list, k: int) -> bytes:
-    sk_bytes = b""
-    for poly in s:
-        sk_bytes += byte_encode_12(poly)
-    return sk_bytes
\ No newline at end of file
+def serialize_secret_key(s, k: int) -> bytes:
+    return byte_encode_array(s, 12)
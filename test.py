@@ -1,15 +1,46 @@
 import sys
 import os
 import time
+import asyncio
+import socket
+from argparse import Namespace
+import tempfile
+import numpy as np
 
 project_root = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(project_root)
 sys.path.insert(0, parent_dir)
 
 from pke.params import ML_KEM_512, ML_KEM_768, ML_KEM_1024
-from kem.keygen import ml_kem_keygen
+from kem.keygen import ml_kem_keygen, ml_kem_keygen_batch, ml_kem_keygen_internal
+from kem.keyring import DecapsulationKeyring
+from kem.compact import CompactDecapsulationKey, CompactKeyCache, expand_compact_key, ml_kem_keygen_compact
 from kem.encapsulate import ml_kem_encaps
-from kem.decapsulate import ml_kem_decaps
+from kem.encapsulate import ml_kem_encaps_deterministic, ml_kem_encaps_batch, ml_kem_encaps_batch_deterministic
+from kem.decapsulate import ml_kem_decaps, ml_kem_decaps_batch
+from kem.cache import EncapsulationKeyCache
+from kem.keys import DecapsulationKey
+from kem.executor import KEMExecutor, WORKER_KEY_LIMIT
+from chat.aes_utils import SecureSession
+from chat.keypool import KeypairPool
+from chat.client import handshake as client_handshake
+from chat.loadgen import run_load
+from chat.protocol import HEADER, MAX_PAYLOAD, FramedSocket, FrameType
+from chat.server import ChatServer
+from chat.tickets import ClientTicketCache
+from chat.tickets import TicketKeyStore
+from utils import instrumentation
+from utils.hash_utils import PRF, XOF, sha3_256, shake128
+from utils.serialization import compress, decompress, compress_encode_array, decode_decompress_array, byte_encode_array
+from utils.serialization import byte_encode, byte_decode, byte_decode_array
+from pke.encrypt import decompress_message
+from pke.decrypt import compress_to_message
+from utils.poly_utils import (
+    ntt, ntt_array, ntt_inverse_array, set_reduction_mode, get_reduction_mode,
+    mulcache, multiply_ntts, matrix_vector_mul_ntt, matrix_vector_mul_ntt_array,
+    matrix_transpose_vector_mul_ntt_array, dot_product_ntt_array,
+    sample_ntt, sample_ntt_matrix, sample_poly_cbd, sample_cbd_vector,
+)
 
 def test_ml_kem_variant(params):
     print(f"\nTesting {params.name}")
@@ -120,6 +151,744 @@ def test_ml_kem_1024():
         print(f"  ✗ ERROR: {e}")
         return False
 
+def test_xof_streaming():
+    print("\nTesting streaming XOF...")
+    rho = bytes(range(32))
+    xof = XOF(rho, 1, 2)
+    chunks = [xof.squeeze(n) for n in (3, 3, 165, 1, 500, 3, 840)]
+    expected = shake128(rho + bytes([1, 2]), sum(len(c) for c in chunks))
+    if b"".join(chunks) == expected:
+        print("  ✓ SUCCESS: Incremental squeezes match one-shot SHAKE128 output")
+        return True
+    print("  ✗ FAILED: Incremental squeezes diverge from SHAKE128 output")
+    return False
+
+def test_ntt_engine():
+    print("\nTesting vectorized NTT engine...")
+    polys = [[(i * 17 + j * 31 + 5) % 3329 for i in range(256)] for j in range(6)]
+    batch = ntt_array([polys[:3], polys[3:]])
+    expected = [ntt(poly) for poly in polys]
+    if batch.reshape(6, 256).tolist() != expected:
+        print("  ✗ FAILED: Batched NTT differs from scalar NTT")
+        return False
+    if ntt_inverse_array(batch).reshape(6, 256).tolist() != polys:
+        print("  ✗ FAILED: Inverse NTT does not round-trip")
+        return False
+    print("  ✓ SUCCESS: Batched NTT matches scalar NTT and round-trips")
+    return True
+
+# Scalar reference versions of the samplers and the bit packing, as they were
+# before vectorization. The known-answer tests below compare against them.
+
+def _scalar_sample_ntt(B):
+    stream, offset, a_hat = shake128(B, 3 * 256), 0, []
+    while len(a_hat) < 256:
+        if offset + 3 > len(stream):
+            stream = shake128(B, 2 * len(stream))
+        C = stream[offset:offset + 3]
+        offset += 3
+        d1 = C[0] + 256 * (C[1] % 16)
+        d2 = (C[1] // 16) + 16 * C[2]
+        if d1 < 3329:
+            a_hat.append(d1)
+        if d2 < 3329 and len(a_hat) < 256:
+            a_hat.append(d2)
+    return a_hat
+
+def _scalar_bits(data):
+    return [(byte >> j) & 1 for byte in data for j in range(8)]
+
+def _scalar_cbd(sigma, nonce, eta):
+    bits = _scalar_bits(PRF(eta, sigma, bytes([nonce])))
+    return [(sum(bits[2 * i * eta + j] for j in range(eta)) -
+             sum(bits[2 * i * eta + eta + j] for j in range(eta))) % 3329 for i in range(256)]
+
+def _scalar_byte_encode(F, d):
+    bits = [(a >> j) & 1 for a in F for j in range(d)]
+    return bytes(sum(bits[8 * i + j] << j for j in range(8)) for i in range(len(bits) // 8))
+
+def _scalar_byte_decode(B, d):
+    bits = _scalar_bits(B)
+    m = 2 ** d if d < 12 else 3329
+    return [sum(bits[i * d + j] << j for j in range(d)) % m for i in range(256)]
+
+def _kat_seed(label, n):
+    return sha3_256(label + n.to_bytes(2, "little"))
+
+def test_sample_ntt_kat():
+    print("\nTesting rejection sampling against the scalar sampler...")
+    # Seed 21 needs more than the first 504 XOF bytes for A_hat[1][2]
+    for n in range(24):
+        rho = _kat_seed(b"sample_ntt", n)
+        A_hat = sample_ntt_matrix(rho, 4)
+        for i in range(4):
+            for j in range(4):
+                expected = _scalar_sample_ntt(rho + bytes([i, j]))
+                if A_hat[i, j].tolist() != expected or sample_ntt(rho + bytes([i, j])) != expected:
+                    print(f"  ✗ FAILED: sample_ntt differs from the scalar sampler for seed {n}, ({i}, {j})")
+                    return False
+    print("  ✓ SUCCESS: sample_ntt and sample_ntt_matrix match the scalar sampler for 24 seeds")
+    return True
+
+def test_cbd_kat():
+    print("\nTesting CBD sampling against the scalar sampler...")
+    for eta in (2, 3):
+        for n in range(16):
+            sigma = _kat_seed(b"cbd", n)
+            expected = [_scalar_cbd(sigma, nonce, eta) for nonce in range(4)]
+            if [sample_poly_cbd(sigma, nonce, eta) for nonce in range(4)] != expected:
+                print(f"  ✗ FAILED: sample_poly_cbd differs from the scalar sampler for eta = {eta}, seed {n}")
+                return False
+            if sample_cbd_vector(sigma, 4, eta, 0).tolist() != expected:
+                print(f"  ✗ FAILED: sample_cbd_vector differs from the scalar sampler for eta = {eta}, seed {n}")
+                return False
+    print("  ✓ SUCCESS: CBD samples match the scalar sampler for eta = 2 and 3")
+    return True
+
+def test_byte_codec_kat():
+    print("\nTesting bit packing against the scalar ByteEncode/ByteDecode...")
+    rng = np.random.default_rng(203)
+    for d in range(1, 13):
+        F = rng.integers(0, 2 ** d if d < 12 else 3329, (4, 256))
+        expected = [_scalar_byte_encode(row.tolist(), d) for row in F]
+        if [byte_encode(row.tolist(), d) for row in F] != expected or byte_encode_array(F, d) != b"".join(expected):
+            print(f"  ✗ FAILED: ByteEncode_{d} differs from the scalar encoder")
+            return False
+        # Random bytes include 12-bit values >= q, which ByteDecode_12 reduces
+        B = rng.integers(0, 256, 4 * 32 * d, dtype=np.uint8).tobytes()
+        expected = [_scalar_byte_decode(B[i * 32 * d:(i + 1) * 32 * d], d) for i in range(4)]
+        if [byte_decode(B[i * 32 * d:(i + 1) * 32 * d], d) for i in range(4)] != expected:
+            print(f"  ✗ FAILED: ByteDecode_{d} differs from the scalar decoder")
+            return False
+        if byte_decode_array(B, d).tolist() != expected:
+            print(f"  ✗ FAILED: byte_decode_array differs from the scalar decoder for d = {d}")
+            return False
+    print("  ✓ SUCCESS: ByteEncode/ByteDecode match the scalar codec for d = 1..12")
+    return True
+
+def test_ek_cache():
+    print("\nTesting encapsulation key cache...")
+    ek, dk = ml_kem_keygen(ML_KEM_768)
+    other_ek, _ = ml_kem_keygen(ML_KEM_768)
+    cache = EncapsulationKeyCache(maxsize=1)
+    m = bytes(32)
+    expected = ml_kem_encaps_deterministic(ek, m, ML_KEM_768)
+    first = ml_kem_encaps_deterministic(ek, m, ML_KEM_768, cache=cache)
+    second = ml_kem_encaps_deterministic(ek, m, ML_KEM_768, cache=cache)
+    ml_kem_encaps_deterministic(other_ek, m, ML_KEM_768, cache=cache)
+    stats = cache.stats()
+    if not (first == second == expected):
+        print("  ✗ FAILED: Cached encapsulation differs from uncached result")
+        return False
+    if (stats['hits'], stats['misses'], stats['evictions'], stats['size']) != (1, 2, 1, 1):
+        print(f"  ✗ FAILED: Unexpected cache stats {stats}")
+        return False
+    print(f"  ✓ SUCCESS: Cached encapsulation matches, stats {stats}")
+    return True
+
+def test_expanded_decapsulation_key():
+    print("\nTesting pre-expanded decapsulation key...")
+    ek, dk = ml_kem_keygen(ML_KEM_768)
+    key = DecapsulationKey.from_bytes(dk, ML_KEM_768)
+    for _ in range(3):
+        K, ct = ml_kem_encaps(ek, ML_KEM_768)
+        tampered_ct = bytearray(ct)
+        tampered_ct[-1] ^= 0x80
+        if ml_kem_decaps(key, ct, ML_KEM_768) != K:
+            print("  ✗ FAILED: Expanded key does not recover K")
+            return False
+        if ml_kem_decaps(key, bytes(tampered_ct), ML_KEM_768) != ml_kem_decaps(dk, bytes(tampered_ct), ML_KEM_768):
+            print("  ✗ FAILED: Expanded key rejects differently from raw dk")
+            return False
+    print("  ✓ SUCCESS: Expanded key matches raw dk for valid and tampered ciphertexts")
+    return True
+
+def test_compact_decapsulation_key():
+    print("\nTesting seed-only compact decapsulation keys...")
+    d, z = bytes(range(32)), bytes(range(32, 64))
+    ek, dk = ml_kem_keygen_internal(d, z, ML_KEM_768)
+    if ml_kem_keygen_internal(d, z, ML_KEM_768) != (ek, dk):
+        print("  ✗ FAILED: ml_kem_keygen_internal is not deterministic")
+        return False
+    compact = CompactDecapsulationKey(d=d, z=z, params=ML_KEM_768, h=dk[-64:-32])
+    if compact.expand() != (ek, dk) or len(compact.to_bytes()) != 96:
+        print("  ✗ FAILED: Compact key does not expand to the original dk")
+        return False
+    direct, parsed = compact.expand_key(), DecapsulationKey.from_bytes(dk, ML_KEM_768)
+    if direct.dk != dk or direct.ek.ek != parsed.ek.ek or not all(
+            np.array_equal(x, y) for x, y in ((direct.s_hat, parsed.s_hat), (direct.ek.t_hat, parsed.ek.t_hat),
+                                              (direct.ek.A_hat, parsed.ek.A_hat))):
+        print("  ✗ FAILED: Key expanded from keygen intermediates differs from the parsed dk")
+        return False
+    ek, compact = ml_kem_keygen_compact(ML_KEM_768)
+    K, ct = ml_kem_encaps(ek, ML_KEM_768)
+    cache = CompactKeyCache(maxsize=2)
+    for _ in range(2):
+        if ml_kem_decaps(expand_compact_key(compact.to_bytes(), ML_KEM_768, cache), ct, ML_KEM_768) != K:
+            print("  ✗ FAILED: Expanded compact key does not recover K")
+            return False
+    if ml_kem_decaps(compact, ct, ML_KEM_768) != K or cache.stats()['hits'] != 1:
+        print("  ✗ FAILED: Compact key decapsulation or cache accounting is wrong")
+        return False
+    try:
+        CompactDecapsulationKey.from_bytes(compact.to_bytes(), ML_KEM_512).expand()
+        print("  ✗ FAILED: Stored H(ek) mismatch was not detected")
+        return False
+    except ValueError:
+        pass
+    print("  ✓ SUCCESS: 96-byte compact key expands to the full dk and decapsulates")
+    return True
+
+def test_keyring():
+    print("\nTesting memory-mapped keyring...")
+    keypairs = ml_kem_keygen_batch(ML_KEM_512, 40)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "keys.kr")
+        with DecapsulationKeyring(path, ML_KEM_512) as keyring:
+            for _, dk in keypairs[:30]:
+                keyring.append(dk)
+        # Lose the index, as after a crash, then reopen and keep appending
+        os.remove(path + ".idx")
+        with DecapsulationKeyring(path) as keyring:
+            for _, dk in keypairs[30:]:
+                keyring.append(dk)
+            if len(keyring) != 40 or any(bytes(keyring.get_by_ek(ek)) != dk for ek, dk in keypairs):
+                print("  ✗ FAILED: Keyring lookup does not return the stored dk")
+                return False
+            ek, _ = keypairs[7]
+            K, ct = ml_kem_encaps(ek, ML_KEM_512)
+            if ml_kem_decaps(keyring.get_by_ek(ek), ct, ML_KEM_512) != K:
+                print("  ✗ FAILED: Keyring dk does not decapsulate")
+                return False
+            if keyring.get_by_ek(ml_kem_keygen(ML_KEM_512)[0]) is not None:
+                print("  ✗ FAILED: Unknown key found in keyring")
+                return False
+        # Slots are little-endian on disk whatever the host byte order
+        with open(path + ".idx", "rb") as f:
+            index = f.read()
+        slots = np.frombuffer(index, dtype="<u8", offset=24)
+        if sorted(slots[slots != 0].tolist()) != list(range(1, 41)):
+            print("  ✗ FAILED: Keyring index slots are not stored little-endian")
+            return False
+    print("  ✓ SUCCESS: Keyring finds every key by H(ek) and rebuilds a lost index")
+    return True
+
+def test_batch_api():
+    print("\nTesting batch KEM API...")
+    keypairs = ml_kem_keygen_batch(ML_KEM_512, 3)
+    ek, dk = keypairs[0]
+    messages = [bytes([i]) * 32 for i in range(4)]
+    batch = ml_kem_encaps_batch_deterministic(ek, messages, ML_KEM_512)
+    single = [ml_kem_encaps_deterministic(ek, m, ML_KEM_512) for m in messages]
+    if batch != single:
+        print("  ✗ FAILED: Batch encapsulation differs from single-item calls")
+        return False
+    per_key = ml_kem_encaps_batch_deterministic([e for e, _ in keypairs], messages[:3], ML_KEM_512)
+    if per_key != [ml_kem_encaps_deterministic(e, m, ML_KEM_512) for (e, _), m in zip(keypairs, messages)]:
+        print("  ✗ FAILED: Per-key batch encapsulation differs from single-item calls")
+        return False
+    ciphertexts = [c for _, c in batch] + [bytes(ML_KEM_512.ct_bytes)]
+    recovered = ml_kem_decaps_batch(dk, ciphertexts, ML_KEM_512)
+    if recovered != [ml_kem_decaps(dk, c, ML_KEM_512) for c in ciphertexts] or recovered[:4] != [K for K, _ in batch]:
+        print("  ✗ FAILED: Batch decapsulation differs from single-item calls")
+        return False
+    # Memoryviews (as handed out by the keyring) are single keys, not sequences of keys
+    if (ml_kem_encaps_batch_deterministic(memoryview(ek), messages, ML_KEM_512) != batch or
+            ml_kem_decaps_batch(memoryview(dk), ciphertexts, ML_KEM_512) != recovered or
+            len(ml_kem_encaps_batch(memoryview(ek), ML_KEM_512, 2)) != 2):
+        print("  ✗ FAILED: Memoryview keys are not treated as single keys")
+        return False
+    print(f"  ✓ SUCCESS: Batches of {len(messages)} match single-item results")
+    return True
+
+def test_kem_executor():
+    print("\nTesting process-pool KEM executor...")
+    ek, dk = ml_kem_keygen(ML_KEM_768)
+    with KEMExecutor(max_workers=2, chunksize=2, preload=[(dk, ML_KEM_768)]) as executor:
+        keypairs = [f.result() for f in executor.keygen(ML_KEM_768, 3)]
+        encapsulated = [f.result() for f in executor.encaps(ek, ML_KEM_768, 5)]
+        decapsulated = executor.decaps(dk, [c for _, c in encapsulated], ML_KEM_768)
+        if not executor.wait(timeout=60):
+            print("  ✗ FAILED: In-flight work did not finish")
+            return False
+        recovered = [f.result() for f in decapsulated]
+    if recovered != [K for K, _ in encapsulated] or len(keypairs) != 3:
+        print("  ✗ FAILED: Worker results do not round-trip")
+        return False
+    print("  ✓ SUCCESS: Worker keygen/encaps/decaps round-trip")
+    return True
+
+def test_executor_preload_pinning():
+    print("\nTesting that preloaded executor keys are never evicted...")
+    ek, dk = ml_kem_keygen(ML_KEM_512)
+    K, c = ml_kem_encaps(ek, ML_KEM_512)
+    others = ml_kem_keygen_batch(ML_KEM_512, WORKER_KEY_LIMIT + 1)
+    with KEMExecutor(max_workers=1, preload=[(dk, ML_KEM_512)]) as executor:
+        # Half go through the worker LRU and push out everything else, half are single-use
+        for i, (_, other_dk) in enumerate(others):
+            executor.decaps(other_dk, [c], ML_KEM_512, cache=i % 2 == 0)
+        executor.decaps(others[0][1], [c], ML_KEM_512)
+        try:
+            recovered = executor.decaps(dk, [c], ML_KEM_512)[0].result(timeout=60)
+        except KeyError:
+            print("  ✗ FAILED: Preloaded key was evicted from the worker")
+            return False
+    if recovered != K:
+        print("  ✗ FAILED: Preloaded key does not decapsulate")
+        return False
+    print(f"  ✓ SUCCESS: Preloaded key survives {WORKER_KEY_LIMIT + 1} other keys")
+    return True
+
+def _wait_for(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+def test_keypair_pool():
+    print("\nTesting keypair pool refill and handout...")
+    try:
+        KeypairPool(ML_KEM_512, low_watermark=0, high_watermark=4)
+        print("  ✗ FAILED: A zero low watermark was accepted")
+        return False
+    except ValueError:
+        pass
+    pool = KeypairPool(ML_KEM_512, low_watermark=2, high_watermark=5, batch_size=2).start()
+    filled = _wait_for(lambda: len(pool) == pool.high_watermark)
+    pool.stop()
+    if not filled:
+        print(f"  ✗ FAILED: Pool reached depth {len(pool)}, expected {pool.high_watermark}")
+        return False
+    keypairs = [pool.pop() for _ in range(pool.high_watermark + 1)]
+    stats = pool.stats()
+    if len(set(keypairs)) != len(keypairs):
+        print("  ✗ FAILED: A keypair was handed out twice")
+        return False
+    if (stats['waits'], stats['served'], stats['generated']) != (1, 6, 6):
+        print(f"  ✗ FAILED: Wrong pool counters: {stats}")
+        return False
+
+    # A shut-down executor makes every refill fail; the thread must log and keep retrying
+    executor = KEMExecutor(max_workers=1)
+    executor.shutdown()
+    pool = KeypairPool(ML_KEM_512, low_watermark=1, high_watermark=2, executor=executor, retry_delay=0.01).start()
+    retried = _wait_for(lambda: pool.stats()['errors'] >= 2)
+    alive = pool._thread is not None and pool._thread.is_alive()
+    pool.stop()
+    if not retried or not alive:
+        print(f"  ✗ FAILED: Refill errors not retried: {pool.stats()}, thread alive: {alive}")
+        return False
+    print("  ✓ SUCCESS: Pool fills to its high watermark, hands out keypairs once and retries failed refills")
+    return True
+
+def test_secure_session():
+    print("\nTesting chat session encryption...")
+    K = os.urandom(32)
+    client, server = SecureSession(K, initiator=True), SecureSession(K, initiator=False)
+    first = client.encrypt(b"first")
+    second = client.encrypt(b"second")
+    reply = server.encrypt(b"reply")
+    if (server.decrypt(*first), server.decrypt(*second), client.decrypt(*reply)) != (b"first", b"second", b"reply"):
+        print("  ✗ FAILED: Messages do not round-trip")
+        return False
+    try:
+        server.decrypt(*first)
+        print("  ✗ FAILED: Replayed record was accepted")
+        return False
+    except ValueError:
+        pass
+    print("  ✓ SUCCESS: Per-direction counters round-trip and reject replays")
+    return True
+
+async def _framing_exchange():
+    loop = asyncio.get_running_loop()
+    raw, sock = socket.socketpair()
+    raw.setblocking(False)
+    # A 16-byte buffer forces both compaction and growth
+    conn = FramedSocket(loop, sock, bufsize=16)
+    frame = lambda frame_type, payload: HEADER.pack(len(payload), frame_type) + payload
+    frames = [(FrameType.DATA, bytes(range(40))), (FrameType.PING, b""),
+              (FrameType.TICKET, b"t" * 3), (FrameType.DATA, bytes(100))]
+    try:
+        reader = asyncio.create_task(conn.read_frame())
+        for byte in frame(FrameType.HELLO, b"split across reads"):
+            await loop.sock_sendall(raw, bytes([byte]))
+            await asyncio.sleep(0.001)
+        frame_type, payload = await asyncio.wait_for(reader, 10)
+        received = [(frame_type, bytes(payload))]
+        await loop.sock_sendall(raw, b"".join(frame(t, p) for t, p in frames))
+        for t, p in frames[:-1]:
+            frame_type, payload = await conn.read_frame()
+            received.append((frame_type, bytes(payload)))
+        received.append((FrameType.DATA, bytes(await conn.expect_frame(FrameType.DATA, 100))))
+        await loop.sock_sendall(raw, HEADER.pack(MAX_PAYLOAD + 1, FrameType.DATA))
+        try:
+            await conn.read_frame()
+            oversized = False
+        except ValueError:
+            oversized = True
+        return received, [(FrameType.HELLO, b"split across reads")] + frames, oversized
+    finally:
+        raw.close()
+        conn.close()
+
+def test_framing():
+    print("\nTesting frame reassembly...")
+    received, expected, oversized = asyncio.run(_framing_exchange())
+    if received != expected:
+        print("  ✗ FAILED: Frames were not reassembled exactly")
+        return False
+    if not oversized:
+        print(f"  ✗ FAILED: A frame over {MAX_PAYLOAD} bytes was accepted")
+        return False
+    print("  ✓ SUCCESS: Split and coalesced frames are returned exactly; oversized frames are rejected")
+    return True
+
+async def _zero_rtt_exchange(server):
+    loop = asyncio.get_running_loop()
+    server_tasks, client_conns = [], []
+
+    async def connect(name, pinned_ek=None, first_message=None):
+        client_sock, server_sock = socket.socketpair()
+        for sock in (client_sock, server_sock):
+            sock.setblocking(False)
+        server_tasks.append(asyncio.create_task(server.handle_client(loop, server_sock, (name, 0))))
+        conn = FramedSocket(loop, client_sock)
+        client_conns.append(conn)
+        _, session, kind = await client_handshake(loop, conn, ClientTicketCache(), name, pinned_ek, first_message)
+        await conn.expect_frame(FrameType.TICKET)
+        return conn, session, kind
+
+    async def next_message(conn, session):
+        return session.decrypt_record(await conn.expect_frame(FrameType.DATA)).decode()
+
+    try:
+        listener, listener_session, _ = await connect("listener")
+        pinned_ek = server.static_key.ek
+        _, _, early_kind = await connect("early", pinned_ek, b"sent in the first flight")
+        early = await asyncio.wait_for(next_message(listener, listener_session), 60)
+        late_conn, late_session, late_kind = await connect("late", pinned_ek)
+        ciphertext, tag = late_session.encrypt(b"sent after the handshake")
+        await late_conn.send_frame(FrameType.DATA, ciphertext, tag)
+        late = await asyncio.wait_for(next_message(listener, listener_session), 60)
+        return early_kind, late_kind, early, late
+    finally:
+        for conn in client_conns:
+            conn.close()
+        for task in server_tasks:
+            task.cancel()
+
+def test_zero_rtt():
+    print("\nTesting 0-RTT handshakes with and without early data...")
+    _, static_dk = ml_kem_keygen(ML_KEM_768)
+    server = ChatServer(ML_KEM_768, workers=1, static_dk=static_dk)
+    try:
+        early_kind, late_kind, early, late = asyncio.run(_zero_rtt_exchange(server))
+    finally:
+        server.executor.shutdown()
+    if (early_kind, late_kind) != ("0-RTT key exchange", "0-RTT key exchange"):
+        print("  ✗ FAILED: Pinned clients did not use 0-RTT")
+        return False
+    if early != "[early:0] sent in the first flight" or late != "[late:0] sent after the handshake":
+        print(f"  ✗ FAILED: Relayed messages are wrong: {early!r}, {late!r}")
+        return False
+    print("  ✓ SUCCESS: 0-RTT early data and post-handshake messages are relayed")
+    return True
+
+async def _loadgen_run(server, **options):
+    loop = asyncio.get_running_loop()
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    listener.setblocking(False)
+    handlers = []
+
+    async def accept():
+        while True:
+            sock, addr = await loop.sock_accept(listener)
+            handlers.append(asyncio.create_task(server.handle_client(loop, sock, addr)))
+
+    acceptor = asyncio.create_task(accept())
+    args = Namespace(host="127.0.0.1", port=listener.getsockname()[1], rate=0, timeout=60,
+                     server_ek=None, **options)
+    try:
+        return await run_load(args)
+    finally:
+        acceptor.cancel()
+        for task in handlers:
+            task.cancel()
+        listener.close()
+
+def test_loadgen():
+    print("\nTesting PING/PONG echo with the load generator...")
+    server = ChatServer(ML_KEM_768, workers=1)
+    try:
+        report = asyncio.run(_loadgen_run(server, connections=2, messages=3, size=64, reconnects=1))
+    finally:
+        server.executor.shutdown()
+    # Every PONG is checked against its PING by the load generator; a mismatch is an error
+    connections, rtt = report['connections'], report['message_rtt_ms']
+    if report['errors'] or connections != {'attempted': 4, 'succeeded': 4, 'failed': 0}:
+        print(f"  ✗ FAILED: Connections failed: {connections}, errors {report['errors']}")
+        return False
+    if rtt['count'] != 12 or not 0 < rtt['p50'] <= rtt['max']:
+        print(f"  ✗ FAILED: Expected 12 echoed messages with latencies, got {rtt}")
+        return False
+    handshakes = {kind: times['count'] for kind, times in report['handshake_ms'].items()}
+    if handshakes != {"Key exchange": 2, "Session resumption": 2}:
+        print(f"  ✗ FAILED: Wrong handshake counts: {handshakes}")
+        return False
+    if report['throughput']['payload_bytes_per_s'] <= 0 or report['config']['messages'] != 3:
+        print(f"  ✗ FAILED: Report is incomplete: {report['throughput']}, {report['config']}")
+        return False
+    print("  ✓ SUCCESS: Every PING is echoed and the report counts all connections and messages")
+    return True
+
+async def _zero_rtt_replay(server):
+    loop = asyncio.get_running_loop()
+    tasks, socks = [], []
+
+    def socketpair():
+        pair = socket.socketpair()
+        for sock in pair:
+            sock.setblocking(False)
+        socks.extend(pair)
+        return pair
+
+    async def pump(src, dst, record=None):
+        while True:
+            data = await loop.sock_recv(src, 65536)
+            if not data:
+                return
+            if record is not None:
+                record += data
+            await loop.sock_sendall(dst, data)
+
+    async def next_message(conn, session, timeout):
+        return session.decrypt_record(await asyncio.wait_for(conn.expect_frame(FrameType.DATA), timeout)).decode()
+
+    async def replay(recorded):
+        # Replays everything the client sent; the handler ends once a record fails
+        attacker, server_sock = socketpair()
+        handler = asyncio.create_task(server.handle_client(loop, server_sock, ("replay", 0)))
+        await loop.sock_sendall(attacker, recorded)
+        await asyncio.wait_for(handler, 60)
+        relayed = []
+        while True:
+            try:
+                relayed.append(await next_message(listener, listener_session, 0.2))
+            except asyncio.TimeoutError:
+                return relayed
+
+    try:
+        client_sock, server_sock = socketpair()
+        tasks.append(asyncio.create_task(server.handle_client(loop, server_sock, ("listener", 0))))
+        listener = FramedSocket(loop, client_sock)
+        _, listener_session, _ = await client_handshake(loop, listener, ClientTicketCache(), "listener")
+        await listener.expect_frame(FrameType.TICKET)
+
+        # The victim's connection runs through a tap that records what it sends
+        client_sock, tap_in = socketpair()
+        tap_out, server_sock = socketpair()
+        recorded = bytearray()
+        tasks.append(asyncio.create_task(pump(tap_in, tap_out, recorded)))
+        tasks.append(asyncio.create_task(pump(tap_out, tap_in)))
+        tasks.append(asyncio.create_task(server.handle_client(loop, server_sock, ("victim", 0))))
+        victim = FramedSocket(loop, client_sock)
+        _, session, _ = await client_handshake(loop, victim, ClientTicketCache(), "victim",
+                                               server.static_key.ek, b"early")
+        await victim.expect_frame(FrameType.TICKET)
+        ciphertext, tag = session.encrypt(b"after the handshake")
+        await victim.send_frame(FrameType.DATA, ciphertext, tag)
+        original = [await next_message(listener, listener_session, 60) for _ in range(2)]
+
+        replayed = await replay(bytes(recorded))
+        # Once the ciphertext has left the replay cache only the early record can come back
+        server.replays.clear()
+        replayed_uncached = await replay(bytes(recorded))
+        return original, replayed, replayed_uncached
+    finally:
+        for task in tasks:
+            task.cancel()
+        for sock in socks:
+            sock.close()
+
+def test_zero_rtt_replay():
+    print("\nTesting replay of a recorded 0-RTT connection...")
+    _, static_dk = ml_kem_keygen(ML_KEM_768)
+    server = ChatServer(ML_KEM_768, workers=1, static_dk=static_dk)
+    try:
+        original, replayed, replayed_uncached = asyncio.run(_zero_rtt_replay(server))
+    finally:
+        server.executor.shutdown()
+    if original != ["[victim:0] early", "[victim:0] after the handshake"]:
+        print(f"  ✗ FAILED: Original connection relayed {original}")
+        return False
+    if replayed or server.replays.replays != 1:
+        print(f"  ✗ FAILED: Replayed connection was accepted and relayed {replayed}")
+        return False
+    if replayed_uncached != ["[replay:0] early"]:
+        print(f"  ✗ FAILED: Records after the early one were replayed: {replayed_uncached}")
+        return False
+    print("  ✓ SUCCESS: Replayed 0-RTT ciphertexts are refused and later records never decrypt again")
+    return True
+
+def test_resumption_tickets():
+    print("\nTesting session resumption tickets...")
+    now = [0.0]
+    store = TicketKeyStore(lifetime=10, rotation_interval=5, clock=lambda: now[0])
+    secret = os.urandom(32)
+    ticket = store.issue(secret)
+    forged = ticket[:-1] + bytes([ticket[-1] ^ 1])
+    now[0] = 7.0
+    later = store.issue(secret)
+    if store.redeem(ticket) != secret or store.redeem(later) != secret or store.redeem(forged) is not None:
+        print("  ✗ FAILED: Tickets do not survive a key rotation or a forgery was accepted")
+        return False
+    now[0] = 12.0
+    if store.redeem(ticket) is not None or store.redeem(later) != secret:
+        print("  ✗ FAILED: Ticket expiry not enforced")
+        return False
+    print("  ✓ SUCCESS: Tickets rotate, expire and reject forgeries")
+    return True
+
+def test_instrumentation():
+    print("\nTesting stage instrumentation...")
+    ek, dk = ml_kem_keygen(ML_KEM_768)
+    instrumentation.enable()
+    try:
+        K, c = ml_kem_encaps(ek, ML_KEM_768)
+        ml_kem_decaps(dk, c, ML_KEM_768)
+    finally:
+        instrumentation.disable()
+    snapshot = instrumentation.snapshot()
+    expected = {"kem.encaps;pke.encrypt;ntt", "kem.decaps;pke.decrypt", "kem.decaps;reencrypt;pke.encrypt"}
+    if not expected <= set(snapshot['stages']) or snapshot['counters'].get('xof_bytes_squeezed', 0) <= 0:
+        print("  ✗ FAILED: Expected stages or counters missing from the snapshot")
+        return False
+    ml_kem_encaps(ek, ML_KEM_768)
+    if instrumentation.snapshot() != snapshot:
+        print("  ✗ FAILED: Disabled instrumentation still recorded data")
+        return False
+    print("  ✓ SUCCESS: Stages and counters recorded only while enabled")
+    return True
+
+def test_reduction_modes():
+    print("\nTesting lazy and eager modular reduction...")
+    ek, dk = ml_kem_keygen(ML_KEM_768)
+    m = bytes(range(32))
+    outputs = {}
+    previous = get_reduction_mode()
+    try:
+        for mode in ("eager", "lazy"):
+            set_reduction_mode(mode)
+            K, c = ml_kem_encaps_deterministic(ek, m, ML_KEM_768)
+            outputs[mode] = (K, c, ml_kem_decaps(dk, c, ML_KEM_768), ntt(list(range(256))))
+    finally:
+        set_reduction_mode(previous)
+    if outputs["eager"] != outputs["lazy"]:
+        print("  ✗ FAILED: Lazy reduction changed the results")
+        return False
+    print("  ✓ SUCCESS: Both reduction modes give identical results")
+    return True
+
+def test_mulcache():
+    print("\nTesting mulcache operands...")
+    rng = np.random.default_rng(7)
+    A_hat = rng.integers(0, 3329, (3, 3, 256))
+    s_hat = rng.integers(0, 3329, (3, 256))
+    r_hat = rng.integers(0, 3329, (2, 3, 256))
+    A_list, s_list = A_hat.tolist(), s_hat.tolist()
+    checks = [
+        (matrix_vector_mul_ntt_array(A_hat, mulcache(s_hat)), matrix_vector_mul_ntt_array(A_hat, s_hat)),
+        (matrix_transpose_vector_mul_ntt_array(mulcache(A_hat), r_hat), matrix_transpose_vector_mul_ntt_array(A_hat, r_hat)),
+        (dot_product_ntt_array(mulcache(s_hat), r_hat), dot_product_ntt_array(s_hat, r_hat)),
+        (np.array(matrix_vector_mul_ntt(A_list, mulcache(s_list))), np.array(matrix_vector_mul_ntt(A_list, s_list))),
+        (np.array(multiply_ntts(s_list[0], mulcache(s_list[1]))), np.array(multiply_ntts(s_list[0], s_list[1]))),
+    ]
+    if not all(np.array_equal(cached, plain) for cached, plain in checks):
+        print("  ✗ FAILED: Mulcache products differ from plain products")
+        return False
+    # A list of arrays nests like a nested list
+    if mulcache(list(s_hat)).twisted != mulcache(s_hat).twisted.tolist():
+        print("  ✗ FAILED: Mulcache of a list of arrays is wrong")
+        return False
+    print("  ✓ SUCCESS: Mulcache products match plain products")
+    return True
+
+def test_fused_products():
+    print("\nTesting fused matrix-vector and dot products...")
+    rng = np.random.default_rng(11)
+    A_hat = rng.integers(0, 3329, (4, 3, 3, 256))
+    r_hat = rng.integers(0, 3329, (4, 3, 256))
+    expected_mv = np.array([[sum(np.array(multiply_ntts(A[i][j], r[j])) for j in range(3)) % 3329
+                             for i in range(3)] for A, r in zip(A_hat.tolist(), r_hat.tolist())])
+    A_t = np.swapaxes(A_hat, -3, -2)
+    A_list, r_list = A_hat[0].tolist(), r_hat[0].tolist()
+    checks = [
+        (matrix_vector_mul_ntt_array(A_hat, r_hat), expected_mv),
+        (matrix_transpose_vector_mul_ntt_array(A_t, r_hat), expected_mv),
+        (matrix_vector_mul_ntt_array(A_hat[0], r_hat), matrix_vector_mul_ntt_array(np.broadcast_to(A_hat[0], A_hat.shape), r_hat)),
+        (np.array(matrix_vector_mul_ntt(A_t[0].tolist(), r_list, transpose=True)), expected_mv[0]),
+        (dot_product_ntt_array(A_hat[:, 0], r_hat), expected_mv[:, 0]),
+        (np.array(matrix_vector_mul_ntt(A_list, r_list)), expected_mv[0]),
+    ]
+    if not all(np.array_equal(fused, plain) for fused, plain in checks):
+        print("  ✗ FAILED: Fused products differ from per-product sums")
+        return False
+    print("  ✓ SUCCESS: Fused products match per-product sums, batched and transposed")
+    return True
+
+def test_compress_codec():
+    print("\nTesting fused compress/encode and decode/decompress...")
+    x = np.arange(3329)
+    for d in (1, 4, 5, 10, 11):
+        compressed = [compress(int(v), d) for v in x]
+        expected = byte_encode_array(np.array(compressed[:3328]).reshape(13, 256), d)
+        if compress_encode_array(x[:3328].reshape(13, 256), d).tobytes() != expected:
+            print(f"  ✗ FAILED: compress_encode_array differs from Compress_{d} + ByteEncode_{d}")
+            return False
+        decoded = decode_decompress_array(expected, d).reshape(-1)
+        if decoded.tolist() != [decompress(c, d) for c in compressed[:3328]]:
+            print(f"  ✗ FAILED: decode_decompress_array differs from ByteDecode_{d} + Decompress_{d}")
+            return False
+    # Compress_1 is 1 exactly on [833, 2496]; Decompress_1(1) rounds q/2 up
+    w = [0] * 256
+    w[0:4] = [832, 833, 2496, 2497]
+    if compress_to_message(w)[0] != 0b0110 or decompress_message(bytes([1]) + bytes(31))[0] != 1665:
+        print("  ✗ FAILED: Message codec does not round like FIPS 203")
+        return False
+    print("  ✓ SUCCESS: Fused codecs match the spec formulas for d = 1, 4, 5, 10, 11")
+    return True
+
+def test_known_ciphertexts():
+    print("\nTesting fixed-seed ciphertexts against recorded vectors...")
+    # SHA3-256 of the ciphertext and the shared key for d = 0..31, z = 32..63, m = 68..99.
+    # This m hits the half-up rounding of Decompress_d in every parameter set, so
+    # the ciphertexts differ from the ones made with ties rounded to even.
+    vectors = {
+        ML_KEM_512: ("14698413e1a59a883622930b1de8ab518b681ab0d63b11c61a8edee6555dfe29",
+                     "f998f902a38a599b63a6695ae14e886b30c8c78f6bfe19093661573ac3949720"),
+        ML_KEM_768: ("f39c19fe14b6939294edeb5ae91b892a344e596998bc43353dab80386e589ead",
+                     "7e3f28045169079922c3735ad4fa378588b912dd579ca0dbc8da5042cce9bb7a"),
+        ML_KEM_1024: ("e8380cac100aca1f5981da5f976cd882385f46d74fd350062a04206eabeaf218",
+                      "9f4a3fe4adbac62f22c2abaaa92a9c18da672f6017e27f03b206a6b48ea0b115"),
+    }
+    d, z, m = bytes(range(32)), bytes(range(32, 64)), bytes(range(68, 100))
+    for params, (c_digest, K_hex) in vectors.items():
+        ek, dk = ml_kem_keygen_internal(d, z, params)
+        K, c = ml_kem_encaps_deterministic(ek, m, params)
+        if sha3_256(c).hex() != c_digest or K.hex() != K_hex:
+            print(f"  ✗ FAILED: {params.name} ciphertext differs from the recorded vector")
+            return False
+        if ml_kem_decaps(dk, c, params) != K:
+            print(f"  ✗ FAILED: {params.name} vector does not decapsulate")
+            return False
+    print("  ✓ SUCCESS: Ciphertexts match the recorded vectors for all parameter sets")
+    return True
+
 def main():
     print("=" * 60)
     print("ML-KEM Success Test with Key Verification (K and K_prime)")
@@ -134,6 +903,32 @@ def main():
     variant_params = [ML_KEM_512, ML_KEM_768, ML_KEM_1024]
     variant_results = [test_ml_kem_variant(p) for p in variant_params]
     results.extend(variant_results)
+    print("\n🧩 COMPONENT TESTS:")
+    results.append(test_xof_streaming())
+    results.append(test_ntt_engine())
+    results.append(test_sample_ntt_kat())
+    results.append(test_cbd_kat())
+    results.append(test_byte_codec_kat())
+    results.append(test_ek_cache())
+    results.append(test_expanded_decapsulation_key())
+    results.append(test_compact_decapsulation_key())
+    results.append(test_keyring())
+    results.append(test_batch_api())
+    results.append(test_kem_executor())
+    results.append(test_executor_preload_pinning())
+    results.append(test_keypair_pool())
+    results.append(test_framing())
+    results.append(test_secure_session())
+    results.append(test_resumption_tickets())
+    results.append(test_zero_rtt())
+    results.append(test_zero_rtt_replay())
+    results.append(test_loadgen())
+    results.append(test_instrumentation())
+    results.append(test_reduction_modes())
+    results.append(test_mulcache())
+    results.append(test_fused_products())
+    results.append(test_compress_codec())
+    results.append(test_known_ciphertexts())
     total_time = time.time() - start_time
     passed = sum(results)
     total = len(results)
@@ -1,4 +1,8 @@
 import hashlib
+from Crypto.Hash import SHAKE128
+from utils.instrumentation import count
+
+SHAKE128_RATE = 168
 
 def sha3_256(data: bytes) -> bytes:
     return hashlib.sha3_256(data).digest()
@@ -39,14 +43,19 @@ class XOF:
         if not (0 <= j <= 255):
             raise ValueError("j must be in range [0, 255]")
         self._input = rho + bytes([i, j])
-        self._output_so_far = 0
+        self._shake = SHAKE128.new(self._input)
+        self._buffer = b""
+        self._offset = 0
 
     def squeeze(self, length: int) -> bytes:
-        # Create a fresh SHAKE instance each time to avoid state corruption
-        shake = hashlib.shake_128()
-        shake.update(self._input)
-        # Skip the bytes we've already output, then get the next 'length' bytes
-        total_output = shake.digest(self._output_so_far + length)
-        result = total_output[self._output_so_far:self._output_so_far + length]
-        self._output_so_far += length
-        return result
\ No newline at end of file
+        end = self._offset + length
+        if end > len(self._buffer):
+            # Refill with whole SHAKE128 blocks, keeping the unread tail
+            blocks = -(-(end - len(self._buffer)) // SHAKE128_RATE)
+            count("xof_bytes_squeezed", blocks * SHAKE128_RATE)
+            self._buffer = self._buffer[self._offset:] + self._shake.read(blocks * SHAKE128_RATE)
+            end -= self._offset
+            self._offset = 0
+        result = self._buffer[self._offset:end]
+        self._offset = end
+        return result
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Dict, List
+
+# Instrumentation is off by default. While it is off, stage() hands back one
+# shared no-op context manager and count() returns at once, so the hooks left
+# in the hot paths cost a function call and a flag check.
+_enabled = False
+_NULL_STAGE = nullcontext()
+_lock = threading.Lock()
+_local = threading.local()
+# ";"-joined stage path -> [calls, total seconds, self seconds]
+_stages: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+_counters: Dict[str, int] = defaultdict(int)
+
+def enable(reset_data: bool = True) -> None:
+    global _enabled
+    if reset_data:
+        reset()
+    _enabled = True
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+def is_enabled() -> bool:
+    return _enabled
+
+def reset() -> None:
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+class _Stage:
+    __slots__ = ("name", "path", "start", "child_time")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "_Stage":
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.path = f"{stack[-1].path};{self.name}" if stack else self.name
+        self.child_time = 0.0
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed = time.perf_counter() - self.start
+        stack = _local.stack
+        stack.pop()
+        if stack:
+            stack[-1].child_time += elapsed
+        with _lock:
+            entry = _stages[self.path]
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] += elapsed - self.child_time
+
+def stage(name: str):
+    """Context manager timing a named stage; stages nest into paths."""
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name)
+
+def count(name: str, n: int = 1) -> None:
+    if _enabled:
+        with _lock:
+            _counters[name] += n
+
+def snapshot() -> Dict[str, dict]:
+    """Timings per stage path (calls, total and self time in ms) and counters."""
+    with _lock:
+        return {
+            'stages': {
+                path: {'calls': calls, 'total_ms': total * 1000, 'self_ms': self_time * 1000}
+                for path, (calls, total, self_time) in sorted(_stages.items())
+            },
+            'counters': dict(_counters),
+        }
+
+def folded_stacks(prefix: str = "") -> str:
+    """Self time per stage path in microseconds, one "a;b;c <us>" line each.
+
+    This is the folded format read by flamegraph.pl, speedscope and inferno.
+    A ``prefix`` becomes the root frame of every stack.
+    """
+    root = f"{prefix};" if prefix else ""
+    with _lock:
+        lines = [f"{root}{path} {round(self_time * 1e6)}" for path, (_, _, self_time) in sorted(_stages.items())]
+    return "\n".join(lines) + ("\n" if lines else "")
+
+def write_folded(path: str) -> None:
+    with open(path, "w") as f:
+        f.write(folded_stacks())
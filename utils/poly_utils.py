@@ -1,8 +1,8 @@
 import numpy as np
 from typing import List, Tuple
 from pke.params import N, Q, ZETA
-from utils.hash_utils import XOF, PRF
-from utils.serialization import bytes_to_bits
+from utils.hash_utils import XOF, PRF, SHAKE128_RATE
+from utils.instrumentation import count
 
 def bit_rev_7(x: int) -> int:
     result = 0
@@ -38,11 +38,46 @@ def _precompute_base_case_factors():
 
 NTT_FACTORS = _precompute_ntt_factors()
 BASE_CASE_FACTORS = _precompute_base_case_factors()
+N_INV = 3303
+
+def _precompute_ntt_layers():
+    zetas = np.array(NTT_FACTORS, dtype=np.int64)
+    forward = []
+    inverse = []
+    length = 128
+    while length >= 2:
+        blocks = N // (2 * length)
+        forward.append((length, blocks, zetas[blocks:2 * blocks].reshape(blocks, 1)))
+        inverse.insert(0, (length, blocks, zetas[2 * blocks - 1:blocks - 1:-1].reshape(blocks, 1)))
+        length //= 2
+    return forward, inverse
+
+NTT_LAYERS, NTT_INVERSE_LAYERS = _precompute_ntt_layers()
+
+# "lazy" skips every % Q that the value bounds below make unnecessary and
+# canonicalizes once at the end of each function; "eager" reduces after every
+# operation as in the spec. Both give identical results in [0, Q).
+#  - Forward NTT: only zeta * hi is reduced, so |coefficient| < 8Q after 7 layers.
+#  - Inverse NTT: the sums grow to < 2^7 * Q, and zeta * difference stays < 2^32.
+#  - Products of canonical NTT coefficients are < 2^37 and sums of up to k = 4
+#    of them stay far inside int64.
+REDUCTION_MODES = ("lazy", "eager")
+_lazy_reduction = True
+
+def set_reduction_mode(mode: str) -> None:
+    global _lazy_reduction
+    if mode not in REDUCTION_MODES:
+        raise ValueError(f"Reduction mode must be one of {REDUCTION_MODES}, got {mode!r}")
+    _lazy_reduction = mode == "lazy"
+
+def get_reduction_mode() -> str:
+    return "lazy" if _lazy_reduction else "eager"
 
 def ntt(f: List[int]) -> List[int]:
     if len(f) != N:
         raise ValueError(f"Input must have length {N}")
     f_hat = f[:]
+    lazy = _lazy_reduction
     k = 1
     length = 128
     while length >= 2:
@@ -50,18 +85,27 @@ def ntt(f: List[int]) -> List[int]:
         while start < N:
             zeta = NTT_FACTORS[k]
             k += 1
-            for j in range(start, start + length):
-                t = (zeta * f_hat[j + length]) % Q
-                f_hat[j + length] = (f_hat[j] - t) % Q
-                f_hat[j] = (f_hat[j] + t) % Q
+            if lazy:
+                for j in range(start, start + length):
+                    t = (zeta * f_hat[j + length]) % Q
+                    f_hat[j + length] = f_hat[j] - t
+                    f_hat[j] = f_hat[j] + t
+            else:
+                for j in range(start, start + length):
+                    t = (zeta * f_hat[j + length]) % Q
+                    f_hat[j + length] = (f_hat[j] - t) % Q
+                    f_hat[j] = (f_hat[j] + t) % Q
             start += 2 * length
         length //= 2
+    if lazy:
+        return [x % Q for x in f_hat]
     return f_hat
 
 def ntt_inverse(f_hat: List[int]) -> List[int]:
     if len(f_hat) != N:
         raise ValueError(f"Input must have length {N}")
     f = f_hat[:]
+    lazy = _lazy_reduction
     k = 127
     length = 2
     while length <= 128:
@@ -69,15 +113,64 @@ def ntt_inverse(f_hat: List[int]) -> List[int]:
         while start < N:
             zeta = NTT_FACTORS[k]
             k -= 1
-            for j in range(start, start + length):
-                t = f[j]
-                f[j] = (t + f[j + length]) % Q
-                f[j + length] = (zeta * (f[j + length] - t)) % Q
+            if lazy:
+                for j in range(start, start + length):
+                    t = f[j]
+                    f[j] = t + f[j + length]
+                    f[j + length] = (zeta * (f[j + length] - t)) % Q
+            else:
+                for j in range(start, start + length):
+                    t = f[j]
+                    f[j] = (t + f[j + length]) % Q
+                    f[j + length] = (zeta * (f[j + length] - t)) % Q
             start += 2 * length
         length *= 2
-    n_inv = 3303
     for i in range(N):
-        f[i] = (f[i] * n_inv) % Q
+        f[i] = (f[i] * N_INV) % Q
+    return f
+
+def ntt_array(f) -> np.ndarray:
+    f_hat = np.array(f, dtype=np.int64)
+    if f_hat.shape[-1:] != (N,):
+        raise ValueError(f"Input must have shape (..., {N})")
+    lead = f_hat.shape[:-1]
+    lazy = _lazy_reduction
+    for length, blocks, zetas in NTT_LAYERS:
+        layer = f_hat.reshape(lead + (blocks, 2, length))
+        lo = layer[..., 0, :]
+        hi = layer[..., 1, :]
+        t = (zetas * hi) % Q
+        if lazy:
+            np.subtract(lo, t, out=hi)
+            lo += t
+        else:
+            hi[...] = (lo - t) % Q
+            lo[...] = (lo + t) % Q
+    if lazy:
+        f_hat %= Q
+    return f_hat
+
+def ntt_inverse_array(f_hat) -> np.ndarray:
+    f = np.array(f_hat, dtype=np.int64)
+    if f.shape[-1:] != (N,):
+        raise ValueError(f"Input must have shape (..., {N})")
+    lead = f.shape[:-1]
+    lazy = _lazy_reduction
+    for length, blocks, zetas in NTT_INVERSE_LAYERS:
+        layer = f.reshape(lead + (blocks, 2, length))
+        lo = layer[..., 0, :]
+        hi = layer[..., 1, :]
+        t = lo.copy()
+        if lazy:
+            lo += hi
+            hi -= t
+            hi *= zetas
+            hi %= Q
+        else:
+            lo[...] = (t + hi) % Q
+            hi[...] = (zetas * (hi - t)) % Q
+    f *= N_INV
+    f %= Q
     return f
 
 def base_case_multiply(a0: int, a1: int, b0: int, b1: int, gamma: int) -> Tuple[int, int]:
@@ -85,7 +178,71 @@ def base_case_multiply(a0: int, a1: int, b0: int, b1: int, gamma: int) -> Tuple[
     c1 = (a0 * b1 + a1 * b0) % Q
     return c0, c1
 
+BASE_CASE_GAMMAS = np.array(BASE_CASE_FACTORS, dtype=np.int64)
+
+class MulCache:
+    """A fixed NTT-domain operand with its gamma-twisted odd coefficients.
+
+    Every base-case product needs a1 * b1 * gamma. For an operand that is
+    multiplied many times (s_hat, t_hat, A_hat of an expanded key) the
+    ``b1 * gamma mod q`` half can be computed once. ``values`` is a polynomial,
+    vector or matrix, either as nested lists or as a (..., 256) array. Indexing
+    a cache gives the cache of that row or polynomial, so the multiply and
+    matrix/dot functions accept a MulCache wherever they take an operand.
+    """
+
+    __slots__ = ("values", "twisted")
+
+    def __init__(self, values, twisted):
+        self.values = values
+        self.twisted = twisted
+
+    def __getitem__(self, index) -> "MulCache":
+        return MulCache(self.values[index], self.twisted[index])
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __iter__(self):
+        return (MulCache(v, t) for v, t in zip(self.values, self.twisted))
+
+def _twist_list(values):
+    # Dispatch on depth rather than element type so a list of arrays nests correctly
+    ndim = np.ndim(values)
+    if ndim > 1:
+        return [_twist_list(v) for v in values]
+    if ndim != 1 or len(values) != N:
+        raise ValueError(f"Polynomials must have length {N}")
+    return [(int(values[2*i + 1]) * BASE_CASE_FACTORS[i]) % Q for i in range(128)]
+
+def mulcache(values) -> MulCache:
+    """Precompute the twisted odd coefficients of an NTT-domain operand."""
+    if isinstance(values, MulCache):
+        return values
+    if isinstance(values, np.ndarray):
+        if values.shape[-1:] != (N,):
+            raise ValueError(f"Operand must have shape (..., {N})")
+        twisted = (values[..., 1::2] * BASE_CASE_GAMMAS) % Q
+        if not values.flags.writeable:
+            twisted.setflags(write=False)
+        return MulCache(values, twisted)
+    return MulCache(values, _twist_list(values))
+
+def stack_mulcaches(caches: List[MulCache]) -> MulCache:
+    return MulCache(np.stack([c.values for c in caches]), np.stack([c.twisted for c in caches]))
+
+def _split_cached(f_hat, g_hat):
+    # Put the cached operand (if any) second; multiplication commutes
+    if isinstance(f_hat, MulCache) and not isinstance(g_hat, MulCache):
+        return g_hat, f_hat
+    return f_hat, g_hat
+
 def multiply_ntts(f_hat: List[int], g_hat: List[int]) -> List[int]:
+    f_hat, g_hat = _split_cached(f_hat, g_hat)
+    if isinstance(g_hat, MulCache):
+        if isinstance(f_hat, MulCache):
+            f_hat = f_hat.values
+        return _multiply_cached(f_hat, g_hat)
     if len(f_hat) != N or len(g_hat) != N:
         raise ValueError(f"Inputs must have length {N}")
     h_hat = [0] * N
@@ -100,33 +257,105 @@ def multiply_ntts(f_hat: List[int], g_hat: List[int]) -> List[int]:
         h_hat[2*i + 1] = c1
     return h_hat
 
-def sample_ntt(B: bytes) -> List[int]:
+def _multiply_cached(f_hat: List[int], g: MulCache) -> List[int]:
+    g_hat, g_twisted = g.values, g.twisted
+    if len(f_hat) != N or len(g_hat) != N:
+        raise ValueError(f"Inputs must have length {N}")
+    h_hat = [0] * N
+    for i in range(128):
+        a0, a1 = f_hat[2*i], f_hat[2*i + 1]
+        h_hat[2*i] = (a0 * g_hat[2*i] + a1 * g_twisted[i]) % Q
+        h_hat[2*i + 1] = (a0 * g_hat[2*i + 1] + a1 * g_hat[2*i]) % Q
+    return h_hat
+
+def multiply_ntts_array(f_hat, g_hat) -> np.ndarray:
+    f_hat, g_hat = _split_cached(f_hat, g_hat)
+    g_twisted = None
+    if isinstance(g_hat, MulCache):
+        g_hat, g_twisted = g_hat.values, g_hat.twisted
+    if isinstance(f_hat, MulCache):
+        f_hat = f_hat.values
+    f_hat = np.asarray(f_hat)
+    g_hat = np.asarray(g_hat)
+    if f_hat.shape[-1:] != (N,) or g_hat.shape[-1:] != (N,):
+        raise ValueError(f"Inputs must have shape (..., {N})")
+    f0, f1 = f_hat[..., 0::2], f_hat[..., 1::2]
+    g0, g1 = g_hat[..., 0::2], g_hat[..., 1::2]
+    h_hat = np.empty(np.broadcast_shapes(f_hat.shape, g_hat.shape), dtype=np.int64)
+    if g_twisted is None:
+        h_hat[..., 0::2] = f0 * g0 + f1 * g1 * BASE_CASE_GAMMAS
+    else:
+        h_hat[..., 0::2] = f0 * g0 + f1 * g_twisted
+    h_hat[..., 1::2] = f0 * g1 + f1 * g0
+    h_hat %= Q
+    return h_hat
+
+SAMPLE_NTT_BYTES = 3 * SHAKE128_RATE
+SAMPLE_NTT_MAX_BYTES = 3 * N * 10  # Safety limit: 10x expected XOF output
+
+def decode_12bit_candidates(buf: bytes) -> np.ndarray:
+    C = np.frombuffer(buf, dtype=np.uint8).astype(np.int64).reshape(-1, 3)
+    candidates = np.empty((C.shape[0], 2), dtype=np.int64)
+    candidates[:, 0] = C[:, 0] + 256 * (C[:, 1] & 0x0F)
+    candidates[:, 1] = (C[:, 1] >> 4) + 16 * C[:, 2]
+    return candidates.reshape(-1)
+
+def _finish_sample_ntt(xof: XOF, candidates: np.ndarray) -> np.ndarray:
+    a_hat = candidates[candidates < Q]
+    squeezed = SAMPLE_NTT_BYTES
+    while len(a_hat) < N:
+        if squeezed >= SAMPLE_NTT_MAX_BYTES:
+            raise RuntimeError(f"sample_ntt: Exceeded maximum XOF output ({SAMPLE_NTT_MAX_BYTES} bytes). This suggests a problem with the XOF.")
+        count("sample_ntt_retries")
+        more = decode_12bit_candidates(xof.squeeze(SHAKE128_RATE))
+        squeezed += SHAKE128_RATE
+        a_hat = np.concatenate((a_hat, more[more < Q]))
+    return a_hat[:N]
+
+def sample_ntt_array(B: bytes) -> np.ndarray:
     if len(B) != 34:
         raise ValueError("Input must be 34 bytes")
-    rho = B[:32]
-    i = B[32]
-    j = B[33]
-    xof = XOF(rho, i, j)
-    a_hat = [0] * N
-    idx = 0
-    max_iterations = N * 10  # Safety limit: 10x expected iterations
-    iterations = 0
-    
-    while idx < N:
-        iterations += 1
-        if iterations > max_iterations:
-            raise RuntimeError(f"sample_ntt: Exceeded maximum iterations ({max_iterations}). This suggests a problem with the XOF.")
-        
-        C = xof.squeeze(3)
-        d1 = C[0] + 256 * (C[1] % 16)
-        d2 = (C[1] // 16) + 16 * C[2]
-        if d1 < Q:
-            a_hat[idx] = d1
-            idx += 1
-        if d2 < Q and idx < N:
-            a_hat[idx] = d2
-            idx += 1
-    return a_hat
+    xof = XOF(B[:32], B[32], B[33])
+    return _finish_sample_ntt(xof, decode_12bit_candidates(xof.squeeze(SAMPLE_NTT_BYTES)))
+
+def sample_ntt(B: bytes) -> List[int]:
+    return sample_ntt_array(B).tolist()
+
+def sample_ntt_matrix(rho: bytes, k: int) -> np.ndarray:
+    xofs = [XOF(rho, i, j) for i in range(k) for j in range(k)]
+    first = b"".join(xof.squeeze(SAMPLE_NTT_BYTES) for xof in xofs)
+    candidates = decode_12bit_candidates(first).reshape(k * k, -1)
+    A_hat = np.empty((k * k, N), dtype=np.int64)
+    for idx, xof in enumerate(xofs):
+        A_hat[idx] = _finish_sample_ntt(xof, candidates[idx])
+    return A_hat.reshape(k, k, N)
+
+def _precompute_cbd_table(eta: int) -> np.ndarray:
+    mask = (1 << eta) - 1
+    return np.array(
+        [bin(v & mask).count("1") - bin(v >> eta).count("1") for v in range(1 << (2 * eta))],
+        dtype=np.int64,
+    ) % Q
+
+CBD_TABLES = {2: _precompute_cbd_table(2), 3: _precompute_cbd_table(3)}
+
+def cbd_array(B, eta: int) -> np.ndarray:
+    if eta not in CBD_TABLES:
+        raise ValueError("eta must be 2 or 3")
+    b = np.frombuffer(B, dtype=np.uint8) if isinstance(B, (bytes, bytearray)) else np.asarray(B)
+    if b.shape[-1:] != (64 * eta,):
+        raise ValueError(f"Input must have shape (..., {64 * eta})")
+    b = b.astype(np.int64)
+    lead = b.shape[:-1]
+    if eta == 2:
+        # Each byte holds two 4-bit (x, y) samples
+        fields = np.stack((b & 0x0F, b >> 4), axis=-1)
+    else:
+        # Every 3 bytes hold four 6-bit (x, y) samples
+        b = b.reshape(lead + (64, 3))
+        w = b[..., 0] | (b[..., 1] << 8) | (b[..., 2] << 16)
+        fields = np.stack([(w >> (6 * i)) & 0x3F for i in range(4)], axis=-1)
+    return CBD_TABLES[eta][fields.reshape(lead + (N,))]
 
 def sample_poly_cbd(sigma: bytes, nonce: int, eta: int) -> List[int]:
     if eta not in {2, 3}:
@@ -134,29 +363,50 @@ def sample_poly_cbd(sigma: bytes, nonce: int, eta: int) -> List[int]:
     if len(sigma) != 32:
         raise ValueError("sigma must be 32 bytes")
     B = PRF(eta, sigma, bytes([nonce]))
-    bits = bytes_to_bits(B)
-    f = [0] * N
-    for i in range(N):
-        x = sum(bits[2 * i * eta + j] for j in range(eta))
-        y = sum(bits[2 * i * eta + eta + j] for j in range(eta))
-        f[i] = (x - y) % Q
-    return f
+    return cbd_array(B, eta).tolist()
+
+def sample_cbd_vector(sigma: bytes, k: int, eta: int, offset: int) -> np.ndarray:
+    if eta not in {2, 3}:
+        raise ValueError("eta must be 2 or 3")
+    if len(sigma) != 32:
+        raise ValueError("sigma must be 32 bytes")
+    B = b"".join(PRF(eta, sigma, bytes([offset + i])) for i in range(k))
+    return cbd_array(np.frombuffer(B, dtype=np.uint8).reshape(k, 64 * eta), eta)
 
 def add_poly(a: List[int], b: List[int], q: int = Q) -> List[int]:
     if len(a) != len(b):
         raise ValueError("Polynomials must have same length")
     return [(x + y) % q for x, y in zip(a, b)]
 
-def matrix_vector_mul_ntt(A_hat, s_hat):
+def _accumulate_products(pairs) -> List[int]:
+    # Sum of the base-case products of all (f_hat, g_hat) pairs in one buffer.
+    # Lazy mode reduces once at the end; eager mode reduces after every product.
+    lazy = _lazy_reduction
+    acc = [0] * N
+    for f_hat, g_hat in pairs:
+        f_hat, g_hat = _split_cached(f_hat, g_hat)
+        if isinstance(f_hat, MulCache):
+            f_hat = f_hat.values
+        if isinstance(g_hat, MulCache):
+            g_hat, g_twisted = g_hat.values, g_hat.twisted
+        else:
+            g_twisted = [g_hat[2*i + 1] * BASE_CASE_FACTORS[i] for i in range(128)]
+        if len(f_hat) != N or len(g_hat) != N:
+            raise ValueError(f"Inputs must have length {N}")
+        for i in range(128):
+            a0, a1 = f_hat[2*i], f_hat[2*i + 1]
+            even = acc[2*i] + a0 * g_hat[2*i] + a1 * g_twisted[i]
+            odd = acc[2*i + 1] + a0 * g_hat[2*i + 1] + a1 * g_hat[2*i]
+            acc[2*i], acc[2*i + 1] = (even, odd) if lazy else (even % Q, odd % Q)
+    return [x % Q for x in acc]
+
+def matrix_vector_mul_ntt(A_hat, s_hat, transpose: bool = False):
+    # A_hat @ s_hat, or A_hat^T @ s_hat with transpose=True; the transpose is
+    # taken by indexing, so no column lists are built
     k = len(s_hat)
-    result = []
-    for i in range(k):
-        component = [0] * N
-        for j in range(k):
-            product = multiply_ntts(A_hat[i][j], s_hat[j])
-            component = add_poly(component, product, Q)
-        result.append(component)
-    return result
+    if transpose:
+        return [_accumulate_products((A_hat[j][i], s_hat[j]) for j in range(k)) for i in range(k)]
+    return [_accumulate_products(zip(A_hat[i], s_hat)) for i in range(k)]
 
 def sample_uniform_poly(rho: bytes, i: int, j: int) -> List[int]:
     input_bytes = rho + bytes([i, j])
@@ -166,12 +416,80 @@ def matrix_vector_multiply_ntt(A_hat, s_hat):
     return matrix_vector_mul_ntt(A_hat, s_hat)
 
 def dot_product_ntt(t_hat: List[List[int]], r1_hat: List[List[int]]) -> List[int]:
-    k = len(t_hat)
-    result = [0] * N
-    for i in range(k):
-        product = multiply_ntts(t_hat[i], r1_hat[i])
-        for j in range(N):
-            result[j] = (result[j] + product[j]) % Q
-    return result
+    return _accumulate_products(zip(t_hat, r1_hat))
+
+# Subscripts of each contraction, the axis summed over in the first and second
+# operand, and the first operand's axis that becomes the output rows (None for
+# a single polynomial). "c" runs over the 128 coefficient pairs.
+_CONTRACTIONS = {
+    "matrix_vector": ("...ijc,...jc->...ic", -2, -2, -3),
+    "transpose": ("...jic,...jc->...ic", -3, -2, -2),
+    "dot": ("...jc,...jc->...c", -2, -2, None),
+}
+
+def _contract_ntt_array(M_hat, v_hat, kind: str) -> np.ndarray:
+    """Fused sum of base-case products for A·s, A^T·r and t^T·r.
+
+    Both halves of every base-case product are sums of two coefficient
+    products, so the operands are stacked along the summed axis and each
+    output half is one einsum written straight into the result. Batch
+    dimensions in front broadcast, and the result is reduced once.
+    """
+    subscripts, m_axis, v_axis, row_axis = _CONTRACTIONS[kind]
+    if not _lazy_reduction:
+        # Spec-literal order: reduce every product, then the sum
+        if kind == "matrix_vector":
+            v_hat = v_hat if isinstance(v_hat, MulCache) else np.asarray(v_hat)
+            return multiply_ntts_array(M_hat, v_hat[..., None, :, :]).sum(axis=-2) % Q
+        if kind == "transpose":
+            v_hat = v_hat if isinstance(v_hat, MulCache) else np.asarray(v_hat)
+            return multiply_ntts_array(M_hat, v_hat[..., :, None, :]).sum(axis=-3) % Q
+        return multiply_ntts_array(M_hat, v_hat).sum(axis=-2) % Q
+    # The twisted operand g contributes (g0, g1 * gamma) to the even half and
+    # (g1, g0) to the odd half; the other operand contributes (f0, f1) to both.
+    # Twist the vector unless the matrix comes with a mulcache.
+    twist_matrix = isinstance(M_hat, MulCache) and not isinstance(v_hat, MulCache)
+    M_twisted = v_twisted = None
+    if isinstance(M_hat, MulCache):
+        M_hat, M_twisted = M_hat.values, M_hat.twisted
+    if isinstance(v_hat, MulCache):
+        v_hat, v_twisted = v_hat.values, v_hat.twisted
+    M_hat = np.asarray(M_hat)
+    v_hat = np.asarray(v_hat)
+    if M_hat.shape[-1:] != (N,) or v_hat.shape[-1:] != (N,):
+        raise ValueError(f"Inputs must have shape (..., {N})")
+    M0, M1 = M_hat[..., 0::2], M_hat[..., 1::2]
+    v0, v1 = v_hat[..., 0::2], v_hat[..., 1::2]
+    if twist_matrix:
+        M_even = np.concatenate([M0, M_twisted], axis=m_axis)
+        M_odd = np.concatenate([M1, M0], axis=m_axis)
+        v_even = v_odd = np.concatenate([v0, v1], axis=v_axis)
+    else:
+        if v_twisted is None:
+            v_twisted = v1 * BASE_CASE_GAMMAS
+        M_even = M_odd = np.concatenate([M0, M1], axis=m_axis)
+        v_even = np.concatenate([v0, v_twisted], axis=v_axis)
+        v_odd = np.concatenate([v1, v0], axis=v_axis)
+    m_dims = 2 if row_axis is None else 3
+    batch = np.broadcast_shapes(M_hat.shape[:-m_dims], v_hat.shape[:-2])
+    rows = () if row_axis is None else (M_hat.shape[row_axis],)
+    out = np.empty(batch + rows + (N,), dtype=np.int64)
+    np.einsum(subscripts, M_even, v_even, out=out[..., 0::2])
+    np.einsum(subscripts, M_odd, v_odd, out=out[..., 1::2])
+    out %= Q
+    return out
+
+def matrix_vector_mul_ntt_array(A_hat, s_hat) -> np.ndarray:
+    # A_hat: (..., k, k, 256), s_hat: (..., k, 256) -> (..., k, 256)
+    return _contract_ntt_array(A_hat, s_hat, "matrix_vector")
+
+def matrix_transpose_vector_mul_ntt_array(A_hat, r_hat) -> np.ndarray:
+    # A_hat: (..., k, k, 256), r_hat: (..., k, 256) -> (..., k, 256)
+    return _contract_ntt_array(A_hat, r_hat, "transpose")
+
+def dot_product_ntt_array(t_hat, r_hat) -> np.ndarray:
+    # t_hat, r_hat: (..., k, 256) -> (..., 256)
+    return _contract_ntt_array(t_hat, r_hat, "dot")
 
-intt = ntt_inverse
\ No newline at end of file
+intt = ntt_inverse
+intt_array = ntt_inverse_array
\ No newline at end of file
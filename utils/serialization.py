@@ -1,5 +1,8 @@
+import math
+import numpy as np
+from functools import lru_cache
 from pke.params import N, Q
-from typing import List
+from typing import List, Tuple
 
 def bits_to_bytes(bits: List[int]) -> bytes:
     if len(bits) % 8 != 0:
@@ -20,39 +23,110 @@ def bytes_to_bits(data: bytes) -> List[int]:
             C[i] = C[i] // 2
     return bits
 
+def _check_encode_range(F: np.ndarray, d: int) -> None:
+    m = 2 ** d if d < 12 else Q
+    if F.size and (F.min() < 0 or F.max() >= m):
+        raise ValueError(f"All elements of F must be in range [0, {m-1}]")
+
+@lru_cache(maxsize=None)
+def _bit_layout(d: int) -> Tuple[int, int, tuple, tuple]:
+    """How d-bit coefficients tile bytes, little-endian as in ByteEncode.
+
+    The smallest group of coefficients that fills whole bytes is packed as a
+    unit. For every byte of a group this lists the (coefficient, shift) terms
+    that land in it, and for every coefficient the (byte, shift) terms it is
+    read back from; a positive shift is to the left.
+    """
+    group = 8 // math.gcd(d, 8)
+    group_bytes = group * d // 8
+    overlaps = lambda i, j: i * d < 8 * j + 8 and (i + 1) * d > 8 * j
+    to_bytes = tuple(tuple((i, i * d - 8 * j) for i in range(group) if overlaps(i, j))
+                     for j in range(group_bytes))
+    from_bytes = tuple(tuple((j, 8 * j - i * d) for j in range(group_bytes) if overlaps(i, j))
+                       for i in range(group))
+    return group, group_bytes, to_bytes, from_bytes
+
+def _shifted(x: np.ndarray, shift: int) -> np.ndarray:
+    return x << shift if shift >= 0 else x >> -shift
+
+def _pack_array(F: np.ndarray, d: int) -> np.ndarray:
+    # F: (..., 256) d-bit values -> (..., 32 * d) uint8
+    if d == 1:
+        return np.packbits(F.astype(np.uint8), axis=-1, bitorder="little")
+    group, group_bytes, to_bytes, _ = _bit_layout(d)
+    C = F.reshape(-1, group)
+    out = np.empty((C.shape[0], group_bytes), dtype=np.uint8)
+    for j, terms in enumerate(to_bytes):
+        acc = _shifted(C[:, terms[0][0]], terms[0][1])
+        for i, shift in terms[1:]:
+            acc = acc | _shifted(C[:, i], shift)
+        out[:, j] = acc & 0xFF
+    return out.reshape(F.shape[:-1] + (32 * d,))
+
+def _unpack_array(b: np.ndarray, d: int) -> np.ndarray:
+    # b: (..., 32 * d) uint8 -> (..., 256) d-bit values
+    if d == 1:
+        return np.unpackbits(b, axis=-1, bitorder="little").astype(np.int64)
+    group, group_bytes, _, from_bytes = _bit_layout(d)
+    C = b.reshape(-1, group_bytes).astype(np.int64)
+    F = np.empty((C.shape[0], group), dtype=np.int64)
+    for i, terms in enumerate(from_bytes):
+        acc = _shifted(C[:, terms[0][0]], terms[0][1])
+        for j, shift in terms[1:]:
+            acc = acc | _shifted(C[:, j], shift)
+        F[:, i] = acc & ((1 << d) - 1)
+    return F.reshape(b.shape[:-1] + (N,))
+
+def _pack_bits(F: np.ndarray, d: int) -> bytes:
+    if d == 12:
+        # Two 12-bit coefficients per 3 bytes
+        pairs = F.reshape(-1, 2)
+        out = np.empty((pairs.shape[0], 3), dtype=np.uint8)
+        out[:, 0] = pairs[:, 0] & 0xFF
+        out[:, 1] = (pairs[:, 0] >> 8) | ((pairs[:, 1] & 0x0F) << 4)
+        out[:, 2] = pairs[:, 1] >> 4
+        return out.tobytes()
+    return _pack_array(F, d).tobytes()
+
+def _unpack_bits(B, d: int) -> np.ndarray:
+    b = np.frombuffer(B, dtype=np.uint8)
+    if d == 12:
+        b = b.astype(np.int64).reshape(-1, 3)
+        F = np.empty((b.shape[0], 2), dtype=np.int64)
+        F[:, 0] = b[:, 0] | ((b[:, 1] & 0x0F) << 8)
+        F[:, 1] = (b[:, 1] >> 4) | (b[:, 2] << 4)
+        return F.reshape(-1, N) % Q
+    return _unpack_array(b.reshape(-1, 32 * d), d)
+
+def byte_encode_array(F, d: int) -> bytes:
+    if not (1 <= d <= 12):
+        raise ValueError("d must be in range [1, 12]")
+    F = np.asarray(F, dtype=np.int64)
+    if F.shape[-1:] != (N,):
+        raise ValueError(f"F must have shape (..., {N})")
+    _check_encode_range(F, d)
+    return _pack_bits(F, d)
+
+def byte_decode_array(B: bytes, d: int) -> np.ndarray:
+    if not (1 <= d <= 12):
+        raise ValueError("d must be in range [1, 12]")
+    if len(B) % (32 * d) != 0:
+        raise ValueError(f"B must have a length that is a multiple of {32 * d}")
+    return _unpack_bits(B, d)
+
 def byte_encode(F: List[int], d: int) -> bytes:
     if not (1 <= d <= 12):
         raise ValueError("d must be in range [1, 12]")
     if len(F) != N:
         raise ValueError(f"F must have length {N}")
-    if d < 12:
-        m = 2 ** d
-        if any(x < 0 or x >= m for x in F):
-            raise ValueError(f"All elements of F must be in range [0, {m-1}]")
-    else:
-        m = Q
-        if any(x < 0 or x >= m for x in F):
-            raise ValueError(f"All elements of F must be in range [0, {m-1}]")
-    bits = []
-    for i in range(N):
-        a = F[i]
-        for j in range(d):
-            bits.append(a % 2)
-            a = (a - bits[-1]) // 2
-    return bits_to_bytes(bits)
+    return byte_encode_array(F, d)
 
 def byte_decode(B: bytes, d: int) -> List[int]:
     if not (1 <= d <= 12):
         raise ValueError("d must be in range [1, 12]")
     if len(B) != 32 * d:
         raise ValueError(f"B must have length {32 * d}")
-    m = 2 ** d if d < 12 else Q
-    bits = bytes_to_bits(B)
-    F = []
-    for i in range(N):
-        value = sum(bits[i * d + j] * (2 ** j) for j in range(d))
-        F.append(value % m)
-    return F
+    return _unpack_bits(B, d)[0].tolist()
 
 def compress(x: int, d: int) -> int:
     if d >= 12:
@@ -64,6 +138,51 @@ def decompress(y: int, d: int) -> int:
         raise ValueError("d must be less than 12")
     return (y * Q + (2 ** (d - 1))) // (2 ** d)
 
+# Array forms of compress and decompress use the same integer formulas, so they
+# round half up exactly as FIPS 203 does and never touch floating point.
+
+def compress_array(x, d: int) -> np.ndarray:
+    if not (1 <= d < 12):
+        raise ValueError("d must be in range [1, 11]")
+    x = np.asarray(x, dtype=np.int64)
+    return (((x << d) + Q // 2) // Q) & ((1 << d) - 1)
+
+def decompress_array(y, d: int) -> np.ndarray:
+    if not (1 <= d < 12):
+        raise ValueError("d must be in range [1, 11]")
+    y = np.asarray(y, dtype=np.int64)
+    return (y * Q + (1 << (d - 1))) >> d
+
+def compress_encode_array(x, d: int) -> np.ndarray:
+    """ByteEncode_d(Compress_d(x)) of (..., 256) coefficients in [0, Q) as (..., 32 * d) uint8."""
+    x = np.asarray(x, dtype=np.int64)
+    if x.shape[-1:] != (N,):
+        raise ValueError(f"x must have shape (..., {N})")
+    return _pack_array(compress_array(x, d), d)
+
+def decode_decompress_array(B, d: int) -> np.ndarray:
+    """Decompress_d(ByteDecode_d(B)) as (..., 256) coefficients.
+
+    B is a (..., 32 * d) uint8 array, or bytes holding whole polynomials, which
+    decode to (-1, 256) like byte_decode_array.
+    """
+    if isinstance(B, np.ndarray):
+        if B.shape[-1:] != (32 * d,):
+            raise ValueError(f"B must have shape (..., {32 * d})")
+    elif len(B) % (32 * d) != 0:
+        raise ValueError(f"B must have a length that is a multiple of {32 * d}")
+    else:
+        B = np.frombuffer(B, dtype=np.uint8).reshape(-1, 32 * d)
+    return decompress_array(_unpack_array(B, d), d)
+
+def encode_messages(w) -> List[bytes]:
+    """Compress_1 and ByteEncode_1 of (batch, 256) coefficients: one 32-byte message per row."""
+    return [row.tobytes() for row in compress_encode_array(np.asarray(w).reshape(-1, N), 1)]
+
+def decode_messages(ms: List[bytes]) -> np.ndarray:
+    """Decompress_1(ByteDecode_1(m)) of 32-byte messages as a (batch, 256) array."""
+    return decode_decompress_array(np.frombuffer(b"".join(ms), dtype=np.uint8).reshape(-1, 32), 1)
+
 def byte_encode_12(f: List[int]) -> bytes:
     return byte_encode(f, 12)
 
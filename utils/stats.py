@@ -0,0 +1,30 @@
+import math
+from typing import Dict, Sequence
+
+def percentile(sorted_values: Sequence[float], p: float) -> float:
+    """Linear-interpolated percentile of already sorted values, p in [0, 100]."""
+    if not sorted_values:
+        raise ValueError("percentile of an empty sequence")
+    rank = (len(sorted_values) - 1) * p / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+def summarize(values: Sequence[float]) -> Dict[str, float]:
+    """count, mean, stddev, min, p50/median, p95, p99 and max of a sample."""
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+    n = len(ordered)
+    mean = sum(ordered) / n
+    variance = sum((v - mean) ** 2 for v in ordered) / (n - 1) if n > 1 else 0.0
+    return {
+        'count': n,
+        'mean': mean,
+        'stddev': math.sqrt(variance),
+        'min': ordered[0],
+        'p50': percentile(ordered, 50),
+        'p95': percentile(ordered, 95),
+        'p99': percentile(ordered, 99),
+        'max': ordered[-1],
+    }